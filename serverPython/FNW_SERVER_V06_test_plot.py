@@ -1,58 +1,74 @@
 from PyQt5 import QtCore, QtWidgets, QtGui
 import pyqtgraph as pg
 import numpy as np
+import queue
+import selectors
 import socket
+import struct  # For binary data packing
+import time
+from operator import itemgetter
 from siphog_unit import SiphogUnit
 from constants_siphog_gui import *  # string/number constants mostly for gui function
 from pyqtgraph import GraphicsLayoutWidget, PlotItem, TextItem
 
-data_key = ["SLED_Current (mA)", "Photo Current (uA)", "SLED_Temp (C)", "Target SAG_PWR (V)", "SAG_PWR (V)", "TEC_Current (mA)"]
+data_key = ("SLED_Current (mA)", "Photo Current (uA)", "SLED_Temp (C)", "Target SAG_PWR (V)", "SAG_PWR (V)", "TEC_Current (mA)")
 host = "127.0.0.1"
 port = 65432
-
-def process_out_msg(out_msg):
-    values_str = out_msg.strip()[1:-1]  # Remove leading '$' and trailing ',' and split by ','
-    values_list = values_str.split(',')
-    values = [float(value.strip()) for value in values_list]  # Convert each value to float
-    return values
+SELECT_TIMEOUT_S = 0.1  # how often the idle server re-checks server_running
+SEND_TIMEOUT_S = 0.1  # a client that blocks sends longer than this is dropped
+SEND_BUFFER_SIZE = 64 * 1024  # bytes buffered before the writer forces a send
+SOCKET_SNDBUF = 1 << 20  # kernel send buffer, sized to absorb batched flushes
+FLUSH_INTERVAL_S = 0.02  # upper bound on latency added by buffering
+EMIT_BATCH_SIZE = 32  # samples per data_updated emission
+EMIT_INTERVAL_S = 0.02  # upper bound on latency added by batching
+RENDER_INTERVAL_MS = 33  # plot refresh period (~30 Hz)
+LABEL_EPSILON = 0.001  # minimum value change that moves a label
+LABEL_REFRESH_S = 0.2  # labels are refreshed at least this often (5 Hz)
+
+# Raw channels read from each message in one call; the two derived data_key
+# channels (photo current, target SAG power) are computed from SLD_PWR
+get_raw_values = itemgetter("SLED_Current (mA)", "SLED_Temp (C)", "SAG_PWR (V)", "TEC_Current (mA)", "SLD_PWR (V)")
+RECORD_FORMAT = b",".join([b"%f"] * len(data_key)) + b"\n"  # One CSV line per sample
+RECORD_STRUCT = struct.Struct("<%df" % len(data_key))  # Little-endian float32 record for binary mode
 
 class SiPhOGThread(QtCore.QThread):
-    data_updated = QtCore.pyqtSignal(list)  # Emitting list of floats
+    data_updated = QtCore.pyqtSignal(object)  # Emitting list of value tuples ordered as data_key
     status_updated = QtCore.pyqtSignal(str)  # Emitting status messages
     current_changed = QtCore.pyqtSignal(int)  # Signal to confirm current change
 
-    def __init__(self, current_mA, parent=None):
+    def __init__(self, current_mA, binary_mode=False, parent=None):
+        """binary_mode: If True, send packed float32 records; if False, send CSV text lines"""
         super().__init__(parent)
+        self.binary_mode = binary_mode
+        # Preallocated receive buffer; client input is only drained, never kept
+        self._rx = bytearray(4096)
+        self._rxv = memoryview(self._rx)
         self.sp = None
         self.server_running = False
         self.current_mA = current_mA
-        self.new_current_mA = None
-        self.current_change_requested = False
-        self.mutex = QtCore.QMutex()
+        self._pending_current = queue.SimpleQueue()
 
     def set_current(self, new_current_mA):
         """Thread-safe method to request current change"""
-        self.mutex.lock()
-        self.new_current_mA = new_current_mA
-        self.current_change_requested = True
-        self.mutex.unlock()
+        self._pending_current.put(new_current_mA)
 
     def check_and_update_current(self):
         """Check if current change is requested and apply it"""
-        self.mutex.lock()
-        if self.current_change_requested and self.sp is not None:
-            try:
-                self.sp.set_sld_setpoints(current_mA=self.new_current_mA)
-                self.current_mA = self.new_current_mA
-                self.current_change_requested = False
-                self.current_changed.emit(self.current_mA)
-                self.status_updated.emit(f"Current updated to {self.current_mA} mA")
-                print(f"Current updated to {self.current_mA} mA")
-            except Exception as e:
-                self.status_updated.emit(f"Failed to update current: {str(e)}")
-                print(f"Failed to update current: {str(e)}")
-                self.current_change_requested = False
-        self.mutex.unlock()
+        if self.sp is None:
+            return
+        try:
+            new_current_mA = self._pending_current.get_nowait()
+        except queue.Empty:
+            return
+        try:
+            self.sp.set_sld_setpoints(current_mA=new_current_mA)
+            self.current_mA = new_current_mA
+            self.current_changed.emit(self.current_mA)
+            self.status_updated.emit(f"Current updated to {self.current_mA} mA")
+            print(f"Current updated to {self.current_mA} mA")
+        except Exception as e:
+            self.status_updated.emit(f"Failed to update current: {str(e)}")
+            print(f"Failed to update current: {str(e)}")
 
     def run(self):
         try:
@@ -70,68 +86,106 @@ class SiPhOGThread(QtCore.QThread):
 
             SERVER = socket.socket()
             SERVER.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)  # Allow socket reuse
+            SERVER.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # Disable Nagle
             SERVER.bind((host, port))
             SERVER.listen(2)
+            SERVER.setblocking(False)
+
+            # Wait on readiness instead of using socket timeouts as control flow
+            sel = selectors.DefaultSelector()
+            sel.register(SERVER, selectors.EVENT_READ)
 
             self.server_running = True
             self.status_updated.emit("Server running, waiting for connection...")
 
             while self.server_running:
                 try:
-                    SERVER.settimeout(1.0)  # Set timeout to allow periodic checks
+                    if not sel.select(timeout=SELECT_TIMEOUT_S):
+                        continue  # No connection pending, re-check server_running
                     conn, address = SERVER.accept()  # accept new connection
-                    conn.settimeout(0.1)  # Set short timeout for non-blocking recv
+                    conn.settimeout(SEND_TIMEOUT_S)  # Bound blocking sends to a stalled client
+                    conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                    conn.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_SNDBUF)
+                    sel.register(conn, selectors.EVENT_READ)
+                    wbuf = conn.makefile('wb', buffering=SEND_BUFFER_SIZE)
+                    last_flush = time.monotonic()
+                    batch = []
+                    last_emit = last_flush
                     self.status_updated.emit(f"Connected with {address}")
                     print("\tConnected with " + str(address) + "\n")
-                    
+
+                    # Bind hot-loop lookups to locals once per connection
+                    photo_scale = 1e6 / PWR_MON_TRANSFER_FUNC
+                    target_scale = TARGET_LOSS_IN_FRACTION / PWR_MON_TRANSFER_FUNC * SAGNAC_TIA_GAIN
+                    binary_mode = self.binary_mode
+                    record_format = RECORD_FORMAT
+                    pack_record = RECORD_STRUCT.pack
+                    get_values = get_raw_values
+                    read_msg = self.sp.read_valid_one_message
+                    check_current = self.check_and_update_current
+                    write = wbuf.write
+                    monotonic = time.monotonic
+                    emit = self.data_updated.emit
+
                     while self.server_running:
                         try:
                             # Check for current change requests
-                            self.check_and_update_current()
-                            
-                            msg = self.sp.read_valid_one_message()
+                            check_current()
 
-                            out_msg_str = ""
+                            sled_current, sled_temp, sag_pwr, tec_current, sld_pwr = get_values(read_msg().data_dict)
 
-                            msg.data_dict["Photo Current (uA)"] = msg.data_dict["SLD_PWR (V)"] / PWR_MON_TRANSFER_FUNC * 1e6
-                            msg.data_dict["Target SAG_PWR (V)"] = TARGET_LOSS_IN_FRACTION * msg.data_dict["SLD_PWR (V)"] / PWR_MON_TRANSFER_FUNC * SAGNAC_TIA_GAIN
+                            # Ordered as data_key
+                            values = (sled_current, sld_pwr * photo_scale, sled_temp,
+                                      sld_pwr * target_scale, sag_pwr, tec_current)
 
-                            for key in data_key:
-                                out_msg_str += "{:f},".format(msg.data_dict[key])
-                            
                             try:
-                                conn.send(out_msg_str[:-1].encode())  # send data to the client
+                                # Buffer fixed-size or newline-framed records and flush in batches
+                                write(pack_record(*values) if binary_mode else record_format % values)
+                                now = monotonic()
+                                if now - last_flush > FLUSH_INTERVAL_S:
+                                    wbuf.flush()
+                                    last_flush = now
+                                    # The client never sends data, so readable means closed
+                                    for key, _ in sel.select(timeout=0):
+                                        if key.fileobj is conn and not conn.recv_into(self._rxv):
+                                            raise ConnectionResetError("client closed connection")
                             except socket.error:
                                 # Client disconnected, break inner loop to wait for new connection
                                 self.status_updated.emit("Client disconnected, waiting for new connection...")
                                 break
 
-                            # Process out_msg and emit parsed values
-                            values = process_out_msg(out_msg_str)
-                            self.data_updated.emit(values)
-                            
-                        except socket.timeout:
-                            # Normal timeout, continue loop
-                            continue
+                            # Emit the typed values directly in batches, no need to re-parse the record
+                            batch.append(values)
+                            if len(batch) >= EMIT_BATCH_SIZE or now - last_emit > EMIT_INTERVAL_S:
+                                emit(batch)
+                                batch = []
+                                last_emit = now
+
                         except Exception as e:
                             self.status_updated.emit(f"Communication error: {str(e)}")
                             print(f"\tCommunication error: {str(e)}")
                             break
-                    
+
+                    if batch:
+                        self.data_updated.emit(batch)
+
+                    sel.unregister(conn)
+                    try:
+                        wbuf.close()
+                    except:
+                        pass
                     try:
                         conn.close()
                     except:
                         pass
-                        
-                except socket.timeout:
-                    # No connection within timeout, continue main loop
-                    continue
+
                 except Exception as e:
                     if self.server_running:  # Only show error if we're still supposed to be running
                         self.status_updated.emit(f"Server error: {str(e)}")
                         print(f"\tServer error: {str(e)}")
 
             self.status_updated.emit("Server stopped")
+            sel.close()
             SERVER.close()
             
         except Exception as e:
@@ -207,8 +261,22 @@ class RealTimePlotWidget(QtWidgets.QWidget):
         self.plotItem.addItem(self.label2)
 
         self.max_data_points = 1000
-        self.data_x1 = []
-        self.data_x2 = []
+        # Ring buffers are stored twice back to back so the latest window is
+        # always a contiguous slice that can be handed to setData without copying
+        self._buf1 = np.zeros(2 * self.max_data_points, dtype=np.float32)
+        self._buf2 = np.zeros(2 * self.max_data_points, dtype=np.float32)
+        self._x_axis = np.arange(self.max_data_points, dtype=np.float32)
+        self._idx = 0
+        self._filled = 0
+        self._dirty = False
+        self._last_label_vals = [None, None]  # (x, y) last drawn per label
+        self._last_label_text = [None, None]
+        self._last_label_t = [0.0, 0.0]
+
+        # Render at a fixed rate instead of once per incoming sample
+        self._render_timer = QtCore.QTimer(self)
+        self._render_timer.timeout.connect(self._render)
+        self._render_timer.start(RENDER_INTERVAL_MS)
 
         # Add layouts to the main layout
         self.layout.addLayout(self.control_layout)
@@ -222,24 +290,55 @@ class RealTimePlotWidget(QtWidgets.QWidget):
         self.stop_button.clicked.connect(self.stop_server)
         self.apply_current_button.clicked.connect(self.apply_current_change)
 
-    def update_plot(self, values):
-        self.data_x1.append(values[3])
-        self.data_x2.append(values[4])
-
-        if len(self.data_x1) > self.max_data_points:
-            self.data_x1.pop(0)
-            self.data_x2.pop(0)
-
-        self.plotDataItem1.setData(self.data_x1)
-        self.plotDataItem2.setData(self.data_x2)
-
-        if self.data_x1:
-            self.label1.setText(f'T: {self.data_x1[-1]:.3f}')
-            self.label1.setPos(len(self.data_x1) - 1, self.data_x1[-1])
-
-        if self.data_x2:
-            self.label2.setText(f'A: {self.data_x2[-1]:.3f}')
-            self.label2.setPos(len(self.data_x2) - 1, self.data_x2[-1])
+    def _window(self, buf):
+        """Return the buffered samples, oldest first, as a view into buf"""
+        if self._filled < self.max_data_points:
+            return buf[:self._filled]
+        return buf[self._idx:self._idx + self.max_data_points]
+
+    def update_plot(self, batch):
+        n = self.max_data_points
+        samples = np.asarray(batch, dtype=np.float32)[-n:]
+        count = len(samples)
+        pos = (self._idx + np.arange(count)) % n
+        self._buf1[pos] = self._buf1[pos + n] = samples[:, 3]
+        self._buf2[pos] = self._buf2[pos + n] = samples[:, 4]
+        self._idx = (self._idx + count) % n
+        self._filled = min(self._filled + count, n)
+        self._dirty = True
+
+    def _render(self):
+        if not self._dirty:
+            return
+        self._dirty = False
+
+        data_x1 = self._window(self._buf1)
+        data_x2 = self._window(self._buf2)
+
+        # Hand pyqtgraph float32 views for both axes so it never builds its own x array
+        x = self._x_axis[:len(data_x1)]
+        self.plotDataItem1.setData(x=x, y=data_x1)
+        self.plotDataItem2.setData(x=x, y=data_x2)
+
+        now = time.monotonic()
+        self._update_label(0, self.label1, 'T', data_x1, now)
+        self._update_label(1, self.label2, 'A', data_x2, now)
+
+    def _update_label(self, slot, label, prefix, data, now):
+        """Move/retext a value label only if it changed meaningfully or is stale"""
+        x, y = len(data) - 1, float(data[-1])
+        last = self._last_label_vals[slot]
+        if (last is not None and last[0] == x and abs(y - last[1]) <= LABEL_EPSILON
+                and now - self._last_label_t[slot] < LABEL_REFRESH_S):
+            return
+        self._last_label_vals[slot] = (x, y)
+        self._last_label_t[slot] = now
+
+        text = f'{prefix}: {y:.3f}'
+        if text != self._last_label_text[slot]:
+            self._last_label_text[slot] = text
+            label.setText(text)
+        label.setPos(x, y)
 
     def update_status(self, status):
         self.status_label.setText(status)
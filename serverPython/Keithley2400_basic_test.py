@@ -1,45 +1,66 @@
+import atexit
+import numpy as np
 import pyvisa
-import time
+
+# VISA session shared by all examples; opened on first use, closed at exit
+_RM = None
+_INSTR = None
 
 def connect_keithley_2400():
-    """Connect to Keithley 2400 SourceMeter"""
-    rm = pyvisa.ResourceManager()
-    instrument = rm.open_resource('GPIB1::24::INSTR')
-    instrument.timeout = 5000  # 5 second timeout
-    return instrument
+    """Connect to Keithley 2400 SourceMeter, reusing the open session if any"""
+    global _RM, _INSTR
+    if _INSTR is None:
+        if _RM is None:
+            _RM = pyvisa.ResourceManager()
+        _INSTR = _RM.open_resource('GPIB1::24::INSTR')
+        _INSTR.timeout = 5000  # 5 second timeout
+        # Explicit terminators let each query complete in a single read
+        _INSTR.read_termination = '\n'
+        _INSTR.write_termination = '\n'
+        _INSTR.query_delay = 0.0
+        _INSTR.chunk_size = 4096
+        _INSTR.send_end = True  # Assert EOI on the last byte (GPIB)
+    return _INSTR
+
+def close_keithley_2400():
+    """Close the shared VISA session"""
+    global _RM, _INSTR
+    if _INSTR is not None:
+        _INSTR.close()
+        _INSTR = None
+    if _RM is not None:
+        _RM.close()
+        _RM = None
+
+atexit.register(close_keithley_2400)
 
 def basic_setup_and_test():
     """Basic setup and measurement example"""
     keithley = connect_keithley_2400()
     
-    try:
-        # Reset and setup
-        keithley.write('*RST')                    # Reset to defaults
-        keithley.write('*CLS')                    # Clear status
-        
+    # Reset, configure and enable output in one compound SCPI write
+    keithley.write(';'.join([
+        '*RST',                      # Reset to defaults
+        '*CLS',                      # Clear status
         # Basic configuration
-        keithley.write(':SOUR:FUNC VOLT')        # Source voltage
-        keithley.write(':SOUR:VOLT:MODE FIXED')  # Fixed voltage mode
-        keithley.write(':SOUR:VOLT 0')           # Set voltage to 0V
-        keithley.write(':SOUR:VOLT:RANG 20')     # 20V range
-        
+        ':SOUR:FUNC VOLT',           # Source voltage
+        ':SOUR:VOLT:MODE FIXED',     # Fixed voltage mode
+        ':SOUR:VOLT 0',              # Set voltage to 0V
+        ':SOUR:VOLT:RANG 20',        # 20V range
         # Measurement setup
-        keithley.write(':SENS:FUNC "CURR"')      # Measure current
-        keithley.write(':SENS:CURR:RANG:AUTO ON') # Auto-range current
-        keithley.write(':SENS:CURR:PROT 0.1')    # 100mA compliance
-        
+        ':SENS:FUNC "CURR"',         # Measure current
+        ':SENS:CURR:RANG:AUTO ON',   # Auto-range current
+        ':SENS:CURR:PROT 0.1',       # 100mA compliance
         # Output control
-        keithley.write(':OUTP ON')               # Turn output on
-        
-        # Take a measurement
-        measurement = keithley.query(':READ?')
-        print(f"Measurement: {measurement.strip()}")
-        
-        # Turn output off
-        keithley.write(':OUTP OFF')
-        
-    finally:
-        keithley.close()
+        ':OUTP ON',                  # Turn output on
+    ]))
+    
+    # Take a measurement
+    measurement = keithley.query(':READ?')
+    print(f"Measurement: {measurement.strip()}")
+    
+    # Turn output off
+    keithley.write(':OUTP OFF')
 
 # Essential Commands for Keithley 2400
 """
@@ -93,64 +114,76 @@ def voltage_sweep_example():
     """Example: Perform a voltage sweep and measure current"""
     keithley = connect_keithley_2400()
     
-    try:
-        # Setup
-        keithley.write('*RST')
-        keithley.write(':SOUR:FUNC VOLT')
-        keithley.write(':SOUR:VOLT:MODE FIXED')
-        keithley.write(':SENS:FUNC "CURR"')
-        keithley.write(':SENS:CURR:PROT 0.01')  # 10mA compliance
-        keithley.write(':OUTP ON')
-        
-        # Sweep from 0V to 5V
-        voltages = [0, 1, 2, 3, 4, 5]
-        results = []
-        
-        for voltage in voltages:
-            keithley.write(f':SOUR:VOLT {voltage}')
-            time.sleep(0.1)  # Small delay for settling
-            
-            # Read voltage and current
-            reading = keithley.query(':READ?')
-            values = reading.strip().split(',')
-            measured_voltage = float(values[0])
-            measured_current = float(values[1])
-            
-            results.append((voltage, measured_voltage, measured_current))
-            print(f"Set: {voltage}V, Measured: {measured_voltage:.6f}V, {measured_current:.9f}A")
-        
-        keithley.write(':OUTP OFF')
-        return results
-        
-    finally:
-        keithley.close()
+    # Sweep from 0V to 5V in 1V steps
+    start, stop, step = 0, 5, 1
+    points = int((stop - start) / step) + 1
+
+    # Let the instrument run the sweep itself and store readings in its trace buffer
+    keithley.write(';'.join([
+        '*RST',
+        ':SOUR:FUNC VOLT',
+        ':SENS:FUNC "CURR"',
+        ':SENS:CURR:PROT 0.01',      # 10mA compliance
+        ':FORM:ELEM VOLT,CURR',      # Only return voltage,current pairs
+        f':SOUR:VOLT:STAR {start}',
+        f':SOUR:VOLT:STOP {stop}',
+        f':SOUR:VOLT:STEP {step}',
+        ':SOUR:VOLT:MODE SWE',
+        ':SOUR:SWE:RANG AUTO',
+        ':SOUR:DEL 0.005',           # 5ms hardware settling before each reading
+        f':TRIG:COUN {points}',      # One trigger per sweep point
+        ':TRAC:CLE',
+        f':TRAC:POIN {points}',
+        ':TRAC:FEED SENS1',
+        ':TRAC:FEED:CONT NEXT',
+        ':OUTP ON',
+    ]))
+
+    keithley.write(':INIT')
+    keithley.query('*OPC?')  # Blocks until the sweep has completed
+    reading = keithley.query(':TRAC:DATA?')
+
+    # Parse the whole buffer in C and split the interleaved V,I pairs
+    values = np.fromstring(reading.strip(), sep=',')
+    measured_voltages = values[0::2]
+    measured_currents = values[1::2]
+
+    results = []
+    for i in range(points):
+        voltage = start + i * step
+        measured_voltage = float(measured_voltages[i])
+        measured_current = float(measured_currents[i])
+
+        results.append((voltage, measured_voltage, measured_current))
+        print(f"Set: {voltage}V, Measured: {measured_voltage:.6f}V, {measured_current:.9f}A")
+    
+    keithley.write(':OUTP OFF')
+    return results
 
 def current_source_example():
     """Example: Use as current source and measure voltage"""
     keithley = connect_keithley_2400()
     
-    try:
-        # Setup as current source
-        keithley.write('*RST')
-        keithley.write(':SOUR:FUNC CURR')        # Source current
-        keithley.write(':SOUR:CURR 0.001')       # 1mA
-        keithley.write(':SENS:FUNC "VOLT"')      # Measure voltage
-        keithley.write(':SENS:VOLT:PROT 10')     # 10V compliance
-        keithley.write(':OUTP ON')
-        
-        # Take measurement
-        reading = keithley.query(':READ?')
-        values = reading.strip().split(',')
-        voltage = float(values[0])
-        current = float(values[1])
-        
-        print(f"Sourcing {current:.6f}A, Measuring {voltage:.6f}V")
-        print(f"Calculated resistance: {voltage/current:.2f} Ohms")
-        
-        keithley.write(':OUTP OFF')
-        
-    finally:
-        keithley.close()
+    # Setup as current source
+    keithley.write(';'.join([
+        '*RST',
+        ':SOUR:FUNC CURR',           # Source current
+        ':SOUR:CURR 0.001',          # 1mA
+        ':SENS:FUNC "VOLT"',         # Measure voltage
+        ':SENS:VOLT:PROT 10',        # 10V compliance
+        ':OUTP ON',
+    ]))
+    
+    # Take measurement
+    reading = keithley.query(':READ?')
+    values = reading.strip().split(',')
+    voltage = float(values[0])
+    current = float(values[1])
+    
+    print(f"Sourcing {current:.6f}A, Measuring {voltage:.6f}V")
+    print(f"Calculated resistance: {voltage/current:.2f} Ohms")
+    
+    keithley.write(':OUTP OFF')
 
 if __name__ == "__main__":
     print("Keithley 2400 Examples")
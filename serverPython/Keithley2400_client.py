@@ -2,188 +2,541 @@
 """
 Keithley 2400 Client
 Test client for communicating with Keithley 2400 Server
+
+The client is network I/O-bound: nearly all wall time is spent waiting on
+socket send/recv and JSON encode/decode, with no numeric kernels. Performance
+work here targets round-trips, syscalls and serialization, not compute.
 """
 
+import asyncio
+import atexit
+import itertools
+import queue
+import selectors
 import socket
 import json
+import struct
+import threading
 import time
-import matplotlib.pyplot as plt
-from datetime import datetime
+from contextlib import contextmanager
+
+try:
+    import orjson  # C JSON codec: encodes straight to bytes and parses bytes-like input
+    json_dumps = orjson.dumps
+    json_loads = orjson.loads
+except ImportError:
+    # Reuse one compact encoder/decoder instead of json.dumps/json.loads per call
+    _json_encode = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False).encode
+    _json_decode = json.JSONDecoder().decode
+    def json_dumps(obj):
+        return _json_encode(obj).encode('utf-8')
+    def json_loads(data):
+        return _json_decode(str(data, 'utf-8'))
+
+FRAME_HEADER = struct.Struct('>I')  # 4-byte big-endian payload length before each JSON message
+SOCKET_BUFFER_SIZE = 64 * 1024
+UNIX_PREFIX = 'unix:'  # host='unix:/tmp/keithley.sock' selects the Unix-domain transport
+
+def frame_command(command):
+    """Encode a command dict as a length-prefixed JSON frame"""
+    payload = json_dumps(command)
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+# Parameterised commands: (function name, command type, data fields).
+# An encoder is generated for each so the hot path is one positional call
+# straight to a framed payload, with no generic command-building layer.
+COMMAND_SCHEMAS = [
+    ("encode_write", "write", ("command",)),
+    ("encode_query", "query", ("command",)),
+    ("encode_setup_voltage_source", "setup_voltage_source", ("voltage", "compliance", "range")),
+    ("encode_setup_current_source", "setup_current_source", ("current", "compliance", "range")),
+    ("encode_output", "output", ("state",)),
+    ("encode_voltage_sweep", "voltage_sweep", ("start", "stop", "steps", "compliance", "delay")),
+]
+
+_ENCODER_TEMPLATE = """
+def {name}({args}):
+    payload = json_dumps({{"type": {type!r}, "data": {{{fields}}}}})
+    return pack_header(len(payload)) + payload
+"""
+
+def _build_encoders(schemas):
+    """Generate one framing function per schema and return them by name"""
+    namespace = {"json_dumps": json_dumps, "pack_header": FRAME_HEADER.pack}
+    for name, command_type, fields in schemas:
+        # 'range' shadows a builtin, so arguments get a trailing underscore
+        args = [f"{field}_" for field in fields]
+        source = _ENCODER_TEMPLATE.format(
+            name=name,
+            args=", ".join(args),
+            type=command_type,
+            fields=", ".join(f"{field!r}: {arg}" for field, arg in zip(fields, args)),
+        )
+        exec(source, namespace)
+    return {name: namespace[name] for name, _, _ in schemas}
+
+globals().update(_build_encoders(COMMAND_SCHEMAS))
+
+class Keithley2400Commands:
+    """Command builders shared by the blocking and asyncio clients.
+    
+    Each method returns whatever send_frame returns: a response dict for
+    Keithley2400Client, an awaitable for AsyncKeithley2400Client.
+    """
+    
+    def write_command(self, scpi_command):
+        """Send SCPI write command"""
+        return self.send_frame(encode_write(scpi_command))
+        
+    def query_command(self, scpi_command):
+        """Send SCPI query command"""
+        return self.send_frame(encode_query(scpi_command))
+        
+    def read_measurement(self):
+        """Take a measurement"""
+        command = {"type": "read"}
+        return self.send_command(command)
+        
+    def setup_voltage_source(self, voltage=0, compliance=0.1, range_val="AUTO"):
+        """Setup as voltage source"""
+        return self.send_frame(encode_setup_voltage_source(voltage, compliance, range_val))
+        
+    def setup_current_source(self, current=0, compliance=10, range_val="AUTO"):
+        """Setup as current source"""
+        return self.send_frame(encode_setup_current_source(current, compliance, range_val))
+        
+    def set_output(self, state="OFF"):
+        """Control output on/off"""
+        return self.send_frame(encode_output(state))
+        
+    def voltage_sweep(self, start=0, stop=5, steps=11, compliance=0.1, delay=0.1):
+        """Perform voltage sweep"""
+        return self.send_frame(encode_voltage_sweep(start, stop, steps, compliance, delay))
+        
+    def get_status(self):
+        """Get instrument status"""
+        command = {"type": "get_status"}
+        return self.send_command(command)
+        
+    def reset_instrument(self):
+        """Reset instrument"""
+        command = {"type": "reset"}
+        return self.send_command(command)
+        
+    def batch(self, commands):
+        """Run a list of command dicts server-side in one round-trip; data holds one response per command"""
+        command = {
+            "type": "batch",
+            "data": {"commands": commands}
+        }
+        return self.send_command(command)
+
+class Keithley2400Client(Keithley2400Commands):
+    """Blocking client: one request/response round-trip per call"""
+
+    # Fixed commands are framed once here rather than encoded on every call
+    _READ_FRAME = frame_command({"type": "read"})
+    _STATUS_FRAME = frame_command({"type": "get_status"})
+    _RESET_FRAME = frame_command({"type": "reset"})
+    _OUTPUT_FRAMES = {
+        "ON": frame_command({"type": "output", "data": {"state": "ON"}}),
+        "OFF": frame_command({"type": "output", "data": {"state": "OFF"}}),
+    }
 
-class Keithley2400Client:
     def __init__(self, host='localhost', port=8888):
         self.host = host
         self.port = port
         self.socket = None
+        self._rw = None  # Buffered file over the socket for framed reads/writes
+        self._rxbuf = bytearray(65536)  # Reused receive buffer, grown on demand
         
     def connect(self):
         """Connect to server"""
         try:
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket.connect((self.host, self.port))
+            if self.host.startswith(UNIX_PREFIX):
+                # Co-located server: a Unix-domain socket skips the TCP/IP stack
+                self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER_SIZE)
+                self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_SIZE)
+                self.socket.connect(self.host[len(UNIX_PREFIX):])
+            else:
+                self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                # Size buffers before connecting so a whole sweep response fits in one read
+                self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER_SIZE)
+                self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_SIZE)
+                self.socket.connect((self.host, self.port))
+                self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # Small commands go out immediately
+                self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)  # Detect dead pooled connections
+            # Buffered I/O: the length prefix and payload usually come from one recv
+            self._rw = self.socket.makefile('rwb', buffering=SOCKET_BUFFER_SIZE)
             print(f"Connected to Keithley server at {self.host}:{self.port}")
             return True
         except Exception as e:
             print(f"Connection failed: {e}")
+            self.socket = None
             return False
             
     def disconnect(self):
         """Disconnect from server"""
         if self.socket:
+            try:
+                self._rw.close()
+            except Exception:
+                pass  # Flushing a dead connection may fail
+            self._rw = None
             self.socket.close()
+            self.socket = None
             print("Disconnected from server")
             
+    def _recv_exact(self, n):
+        """Receive exactly n bytes into the reusable buffer and return a view of them"""
+        if n > len(self._rxbuf):
+            self._rxbuf = bytearray(n)
+        view = memoryview(self._rxbuf)[:n]
+        if self._rw.readinto(view) != n:
+            raise ConnectionError("Server closed the connection")
+        return view
+            
+    def _recv_response(self):
+        """Receive the length prefix, then exactly that many payload bytes"""
+        length, = FRAME_HEADER.unpack(self._recv_exact(FRAME_HEADER.size))
+        return json_loads(self._recv_exact(length))
+        
     def send_command(self, command):
         """Send command to server and get response"""
+        return self.send_frame(frame_command(command))
+        
+    def send_frame(self, frame):
+        """Send an already framed command and get response"""
         try:
-            # Send command
-            command_json = json.dumps(command)
-            self.socket.send(command_json.encode('utf-8'))
+            # flush writes the whole frame, guarding against short writes
+            self._rw.write(frame)
+            self._rw.flush()
             
-            # Receive response
-            response_data = self.socket.recv(4096).decode('utf-8')
-            response = json.loads(response_data)
-            
-            return response
+            return self._recv_response()
             
         except Exception as e:
+            # The stream may be mid-frame, so the connection cannot be reused
+            self.disconnect()
             return {"status": "error", "message": f"Communication error: {e}"}
             
-    def write_command(self, scpi_command):
-        """Send SCPI write command"""
-        command = {
-            "type": "write",
-            "data": {"command": scpi_command}
-        }
-        return self.send_command(command)
-        
-    def query_command(self, scpi_command):
-        """Send SCPI query command"""
-        command = {
-            "type": "query",
-            "data": {"command": scpi_command}
-        }
-        return self.send_command(command)
-        
     def read_measurement(self):
         """Take a measurement"""
-        command = {"type": "read"}
-        return self.send_command(command)
+        return self.send_frame(self._READ_FRAME)
         
-    def setup_voltage_source(self, voltage=0, compliance=0.1, range_val="AUTO"):
-        """Setup as voltage source"""
-        command = {
-            "type": "setup_voltage_source",
-            "data": {
-                "voltage": voltage,
-                "compliance": compliance,
-                "range": range_val
-            }
-        }
-        return self.send_command(command)
+    def get_status(self):
+        """Get instrument status"""
+        return self.send_frame(self._STATUS_FRAME)
         
-    def setup_current_source(self, current=0, compliance=10, range_val="AUTO"):
-        """Setup as current source"""
-        command = {
-            "type": "setup_current_source",
-            "data": {
-                "current": current,
-                "compliance": compliance,
-                "range": range_val
-            }
-        }
-        return self.send_command(command)
+    def reset_instrument(self):
+        """Reset instrument"""
+        return self.send_frame(self._RESET_FRAME)
         
     def set_output(self, state="OFF"):
         """Control output on/off"""
-        command = {
-            "type": "output",
-            "data": {"state": state}
-        }
-        return self.send_command(command)
+        frame = self._OUTPUT_FRAMES.get(state)
+        if frame is None:
+            return super().set_output(state)
+        return self.send_frame(frame)
+
+class ClientPool:
+    """Keeps connected clients alive between uses to skip TCP setup/teardown.
+    
+    Clients are created lazily up to maxsize; acquire() blocks when all are in
+    use. Clients whose connection dropped are discarded on release.
+    """
+    
+    def __init__(self, maxsize=4, host='localhost', port=8888):
+        self.maxsize = maxsize
+        self.host = host
+        self.port = port
+        self._idle = queue.SimpleQueue()
+        self._created = 0
+        self._lock = threading.Lock()
         
-    def voltage_sweep(self, start=0, stop=5, steps=11, compliance=0.1, delay=0.1):
-        """Perform voltage sweep"""
-        command = {
-            "type": "voltage_sweep",
-            "data": {
-                "start": start,
-                "stop": stop,
-                "steps": steps,
-                "compliance": compliance,
-                "delay": delay
-            }
-        }
-        return self.send_command(command)
+    def _get(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_create = self._created < self.maxsize
+            if can_create:
+                self._created += 1
+        if not can_create:
+            return self._idle.get()  # Wait for another user to release one
+        client = Keithley2400Client(self.host, self.port)
+        if not client.connect():
+            with self._lock:
+                self._created -= 1
+            return None
+        return client
         
-    def get_status(self):
-        """Get instrument status"""
-        command = {"type": "get_status"}
-        return self.send_command(command)
+    def release(self, client):
+        """Return a client to the pool, dropping it if its connection is gone"""
+        if client.socket is None:
+            with self._lock:
+                self._created -= 1
+        else:
+            self._idle.put(client)
+            
+    @contextmanager
+    def acquire(self):
+        """Context manager yielding a connected client, or None if connecting failed"""
+        client = self._get()
+        try:
+            yield client
+        finally:
+            if client is not None:
+                self.release(client)
+                
+    def close(self):
+        """Disconnect all idle clients"""
+        while True:
+            try:
+                client = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            client.disconnect()
+            with self._lock:
+                self._created -= 1
+
+# Shared pool used by the demos; connections are only opened on first acquire()
+client_pool = ClientPool()
+atexit.register(client_pool.close)
+
+class MultiKeithley2400Client:
+    """Drives several Keithley servers at once from one thread.
+    
+    broadcast() writes every command first, then uses a selector to collect
+    responses as each instrument answers, so N instruments cost about one
+    round-trip instead of N.
+    """
+    
+    def __init__(self, instruments):
+        # instruments: {name: (host, port)}
+        self.clients = {name: Keithley2400Client(host, port) for name, (host, port) in instruments.items()}
+        self._sel = selectors.DefaultSelector()
+        self._registered = {}  # name -> socket registered with the selector
         
-    def reset_instrument(self):
-        """Reset instrument"""
-        command = {"type": "reset"}
-        return self.send_command(command)
+    def connect(self):
+        """Connect every instrument not connected yet; returns True only if all are connected"""
+        connected = True
+        for client in self.clients.values():
+            if client.socket is None and not client.connect():
+                connected = False
+        self._sync_registrations()
+        return connected
+        
+    def disconnect(self):
+        """Disconnect from every instrument"""
+        for client in self.clients.values():
+            client.disconnect()
+        self._sync_registrations()
+        
+    def _sync_registrations(self):
+        """Register each client's current socket, dropping ones the client closed or replaced on its own"""
+        for name, client in self.clients.items():
+            sock = self._registered.get(name)
+            if sock is client.socket:
+                continue
+            if sock is not None:
+                self._sel.unregister(sock)
+                del self._registered[name]
+            if client.socket is not None:
+                self._sel.register(client.socket, selectors.EVENT_READ, name)
+                self._registered[name] = client.socket
+                
+    def broadcast(self, commands):
+        """Send {name: command} to the named instruments and return {name: response}"""
+        # A client may have disconnected (or reconnected) outside broadcast, e.g. after a failed send_command
+        self._sync_registrations()
+        responses = {}
+        waiting = set()
+        for name, command in commands.items():
+            client = self.clients[name]
+            if client.socket is None:
+                responses[name] = {"status": "error", "message": "Not connected"}
+                continue
+            try:
+                client._rw.write(frame_command(command))
+                client._rw.flush()
+                waiting.add(name)
+            except Exception as e:
+                responses[name] = self._fail(name, e)
+                
+        while waiting:
+            for key, _ in self._sel.select():
+                name = key.data
+                if name not in waiting:
+                    continue
+                waiting.discard(name)
+                try:
+                    responses[name] = self.clients[name]._recv_response()
+                except Exception as e:
+                    responses[name] = self._fail(name, e)
+        return responses
+        
+    def _fail(self, name, error):
+        """Drop a broken connection and build its error response"""
+        client = self.clients[name]
+        client.disconnect()
+        self._sync_registrations()
+        return {"status": "error", "message": f"Communication error: {error}"}
 
-def demo_basic_operations():
-    """Demonstrate basic operations"""
-    client = Keithley2400Client()
+class AsyncKeithley2400Client(Keithley2400Commands):
+    """asyncio client that pipelines commands over a single connection.
     
-    if not client.connect():
-        return
+    Commands are written back to back without waiting for replies, each
+    tagged with a request id that the server echoes; one background reader
+    task resolves the matching future as each framed response arrives, so
+    quick reads can interleave with a long sweep and N independent commands
+    cost about one round-trip.
+    """
+    
+    def __init__(self, host='localhost', port=8888):
+        self.host = host
+        self.port = port
+        self._reader = None
+        self._writer = None
+        self._reader_task = None
+        self._next_id = itertools.count()
+        self._pending = {}  # Request id -> future awaiting its response
         
-    try:
+    async def connect(self):
+        """Connect to server"""
+        try:
+            if self.host.startswith(UNIX_PREFIX):
+                self._reader, self._writer = await asyncio.open_unix_connection(self.host[len(UNIX_PREFIX):])
+            else:
+                self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+            self._reader_task = asyncio.create_task(self._read_responses())
+            print(f"Connected to Keithley server at {self.host}:{self.port}")
+            return True
+        except Exception as e:
+            print(f"Connection failed: {e}")
+            return False
+            
+    async def disconnect(self):
+        """Disconnect from server"""
+        if self._writer:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except Exception:
+                pass
+            print("Disconnected from server")
+        if self._reader_task:
+            self._reader_task.cancel()
+            
+    async def _read_responses(self):
+        """Background task: match each framed response to its pending future by id"""
+        try:
+            while True:
+                header = await self._reader.readexactly(FRAME_HEADER.size)
+                length, = FRAME_HEADER.unpack(header)
+                response = json_loads(await self._reader.readexactly(length))
+                future = self._pending.pop(response.pop('id', None), None)
+                if future is not None and not future.done():
+                    future.set_result(response)
+        except Exception as e:
+            # Whatever stopped the reader (closed connection, malformed response), no reply can be
+            # matched to its request any more: fail everything waiting instead of leaving it hanging
+            if isinstance(e, (asyncio.IncompleteReadError, ConnectionError)):
+                error = ConnectionError(f"Server closed the connection: {e}")
+            else:
+                error = ConnectionError(f"Invalid response from server: {e!r}")
+                self._writer.close()
+            while self._pending:
+                _, future = self._pending.popitem()
+                if not future.done():
+                    future.set_exception(error)
+                    
+    def send_command(self, command):
+        """Send command to server and await its response"""
+        return self.send_frame(frame_command(command))
+        
+    async def send_frame(self, frame):
+        """Send an already framed command and await its response"""
+        request_id = next(self._next_id)
+        try:
+            if self._reader_task is None or self._reader_task.done():
+                raise ConnectionError("Not connected (response reader stopped)")
+            # Splice the id in as the first key; every command object has a "type" key
+            payload = b'{"id":%d,' % request_id + frame[FRAME_HEADER.size + 1:]
+            future = asyncio.get_running_loop().create_future()
+            self._pending[request_id] = future
+            self._writer.write(FRAME_HEADER.pack(len(payload)) + payload)
+            await self._writer.drain()
+            return await future
+            
+        except Exception as e:
+            self._pending.pop(request_id, None)
+            return {"status": "error", "message": f"Communication error: {e}"}
+            
+    async def pipeline(self, commands):
+        """Send several commands without waiting in between; results are in command order"""
+        return await asyncio.gather(*(self.send_command(command) for command in commands))
+
+def demo_basic_operations():
+    """Demonstrate basic operations"""
+    with client_pool.acquire() as client:
+        if client is None:
+            return
+            
         print("\n=== BASIC OPERATIONS DEMO ===")
         
+        # Send the whole sequence as one batch: a single round-trip
+        num_reads = 3
+        response = client.batch([
+            {"type": "get_status"},
+            {"type": "reset"},
+            {"type": "setup_voltage_source", "data": {"voltage": 1.0, "compliance": 0.01, "range": "AUTO"}},
+            {"type": "output", "data": {"state": "ON"}},
+            *[{"type": "read"}] * num_reads,
+            {"type": "output", "data": {"state": "OFF"}},
+        ])
+        if response["status"] != "success":
+            print(f"Batch failed: {response['message']}")
+            return
+        status, reset, setup, output_on, *reads, output_off = response["data"]
+        
         # Get instrument status
         print("\n1. Getting instrument status...")
-        response = client.get_status()
-        if response["status"] == "success":
-            print(f"Instrument: {response['data']['instrument']}")
-            print(f"Output: {response['data']['output']}")
-            print(f"Source Function: {response['data']['source_function']}")
+        if status["status"] == "success":
+            print(f"Instrument: {status['data']['instrument']}")
+            print(f"Output: {status['data']['output']}")
+            print(f"Source Function: {status['data']['source_function']}")
         
         # Reset instrument
         print("\n2. Resetting instrument...")
-        response = client.reset_instrument()
-        print(f"Reset: {response['message']}")
+        print(f"Reset: {reset['message']}")
         
         # Setup voltage source
         print("\n3. Setting up voltage source (1V, 10mA compliance)...")
-        response = client.setup_voltage_source(voltage=1.0, compliance=0.01)
-        print(f"Setup: {response['message']}")
+        print(f"Setup: {setup['message']}")
         
         # Turn output on
         print("\n4. Turning output ON...")
-        response = client.set_output("ON")
-        print(f"Output: {response['message']}")
+        print(f"Output: {output_on['message']}")
         
         # Take measurements
         print("\n5. Taking measurements...")
-        for i in range(3):
-            response = client.read_measurement()
+        for i, response in enumerate(reads):
             if response["status"] == "success":
                 data = response["data"]
                 print(f"  Measurement {i+1}: {data['voltage']:.6f}V, {data['current']:.9f}A")
-            time.sleep(0.5)
         
         # Turn output off
         print("\n6. Turning output OFF...")
-        response = client.set_output("OFF")
-        print(f"Output: {response['message']}")
-        
-    finally:
-        client.disconnect()
+        print(f"Output: {output_off['message']}")
 
-def demo_voltage_sweep():
-    """Demonstrate voltage sweep with plotting"""
-    client = Keithley2400Client()
-    
-    if not client.connect():
-        return
-        
-    try:
+def demo_voltage_sweep(headless=False):
+    """Demonstrate voltage sweep with plotting; headless saves the plot to iv.png instead of showing it"""
+    with client_pool.acquire() as client:
+        if client is None:
+            return
+            
         print("\n=== VOLTAGE SWEEP DEMO ===")
         
         # Perform voltage sweep
@@ -200,41 +553,51 @@ def demo_voltage_sweep():
             data = response["data"]
             print(f"Sweep completed: {len(data)} points")
             
-            # Extract data for plotting
-            voltages = [point["measured_voltage"] for point in data]
-            currents = [point["measured_current"] for point in data]
+            import numpy as np  # Only the sweep demo needs NumPy
+            
+            # Extract data for plotting in one pass into preallocated arrays
+            voltages = np.empty(len(data))
+            currents = np.empty(len(data))
+            for i, point in enumerate(data):
+                voltages[i] = point["measured_voltage"]
+                currents[i] = point["measured_current"]
+            
+            # Imported here so other demos skip matplotlib; Agg avoids loading a GUI toolkit
+            import matplotlib
+            if headless:
+                matplotlib.use('Agg')
+            import matplotlib.pyplot as plt
             
             # Plot I-V curve
-            plt.figure(figsize=(10, 6))
-            plt.plot(voltages, currents, 'b.-', linewidth=2, markersize=6)
-            plt.xlabel('Voltage (V)')
-            plt.ylabel('Current (A)')
-            plt.title('I-V Characteristic')
-            plt.grid(True, alpha=0.3)
-            plt.axhline(y=0, color='k', linestyle='-', alpha=0.3)
-            plt.axvline(x=0, color='k', linestyle='-', alpha=0.3)
+            # Object-oriented API; constrained_layout replaces a tight_layout pass
+            fig, ax = plt.subplots(figsize=(10, 6), constrained_layout=True)
+            ax.plot(voltages, currents, 'b.-', linewidth=2, markersize=6)
+            ax.set(xlabel='Voltage (V)', ylabel='Current (A)', title='I-V Characteristic')
+            ax.grid(True, alpha=0.3)
+            ax.axhline(y=0, color='k', linestyle='-', alpha=0.3)
+            ax.axvline(x=0, color='k', linestyle='-', alpha=0.3)
             
             # Show some statistics
-            max_current = max(abs(c) for c in currents)
+            max_current = float(np.abs(currents).max())
             print(f"Maximum current: {max_current:.9f} A")
             
-            plt.tight_layout()
-            plt.show()
+            if headless:
+                fig.savefig('iv.png', dpi=120)
+                plt.close(fig)
+                print("Plot saved to iv.png")
+            else:
+                plt.show()
             
         else:
             print(f"Sweep failed: {response['message']}")
             
-    finally:
-        client.disconnect()
 
 def demo_current_source():
     """Demonstrate current source mode"""
-    client = Keithley2400Client()
-    
-    if not client.connect():
-        return
-        
-    try:
+    with client_pool.acquire() as client:
+        if client is None:
+            return
+            
         print("\n=== CURRENT SOURCE DEMO ===")
         
         # Setup current source
@@ -264,17 +627,97 @@ def demo_current_source():
         response = client.set_output("OFF")
         print(f"Output: {response['message']}")
         
-    finally:
-        client.disconnect()
 
-def interactive_mode():
-    """Interactive command mode"""
-    client = Keithley2400Client()
+async def _demo_pipelined_reads(count, host, port):
+    client = AsyncKeithley2400Client(host, port)
     
-    if not client.connect():
+    if not await client.connect():
         return
         
     try:
+        print(f"\n=== PIPELINED READ DEMO ({count} reads) ===")
+        start = time.perf_counter()
+        responses = await client.pipeline([{"type": "read"}] * count)
+        elapsed = time.perf_counter() - start
+        
+        for i, response in enumerate(responses):
+            if response["status"] == "success":
+                data = response["data"]
+                print(f"  Measurement {i+1}: {data['voltage']:.6f}V, {data['current']:.9f}A")
+            else:
+                print(f"  Measurement {i+1} failed: {response['message']}")
+        print(f"{count} reads in {elapsed * 1000:.1f} ms")
+        
+    finally:
+        await client.disconnect()
+
+def demo_pipelined_reads(count=10, host='localhost', port=8888):
+    """Demonstrate pipelined commands with the asyncio client"""
+    asyncio.run(_demo_pipelined_reads(count, host, port))
+
+def _print_message(response):
+    print(f"  {response['message']}")
+
+def _h_status(client, arg):
+    response = client.get_status()
+    if response["status"] == "success":
+        for key, value in response["data"].items():
+            print(f"  {key}: {value}")
+
+def _h_reset(client, arg):
+    _print_message(client.reset_instrument())
+
+def _h_read(client, arg):
+    response = client.read_measurement()
+    if response["status"] == "success":
+        data = response["data"]
+        print(f"  V: {data['voltage']:.6f}V, I: {data['current']:.9f}A")
+
+def _h_output(client, arg):
+    _print_message(client.set_output(arg.split()[0].upper()))
+
+def _h_write(client, arg):
+    _print_message(client.write_command(arg))
+
+def _h_query(client, arg):
+    response = client.query_command(arg)
+    if response["status"] == "success":
+        print(f"  {response['data']}")
+    else:
+        print(f"  Error: {response['message']}")
+
+def _h_vsource(client, arg):
+    _print_message(client.setup_voltage_source(voltage=float(arg.split()[0])))
+
+def _h_isource(client, arg):
+    _print_message(client.setup_current_source(current=float(arg.split()[0])))
+
+def _h_sweep(client, arg):
+    response = client.voltage_sweep(start=0, stop=5, steps=11)
+    if response["status"] == "success":
+        print(f"  Sweep completed: {len(response['data'])} points")
+    else:
+        print(f"  Error: {response['message']}")
+
+# Interactive commands keyed on the first word; handlers take (client, rest_of_line)
+INTERACTIVE_COMMANDS = {
+    "status": _h_status,
+    "reset": _h_reset,
+    "read": _h_read,
+    "output": _h_output,
+    "write": _h_write,
+    "query": _h_query,
+    "vsource": _h_vsource,
+    "isource": _h_isource,
+    "sweep": _h_sweep,
+}
+
+def interactive_mode():
+    """Interactive command mode"""
+    with client_pool.acquire() as client:
+        if client is None:
+            return
+            
         print("\n=== INTERACTIVE MODE ===")
         print("Available commands:")
         print("  status - Get instrument status")
@@ -290,85 +733,51 @@ def interactive_mode():
         
         while True:
             try:
-                cmd = input("\nKeithley> ").strip()
-                
-                if cmd == "quit":
+                tokens = input("\nKeithley> ").split(maxsplit=1)
+                if not tokens:
+                    continue
+                    
+                name = tokens[0]
+                if name == "quit":
                     break
-                elif cmd == "status":
-                    response = client.get_status()
-                    if response["status"] == "success":
-                        for key, value in response["data"].items():
-                            print(f"  {key}: {value}")
-                elif cmd == "reset":
-                    response = client.reset_instrument()
-                    print(f"  {response['message']}")
-                elif cmd == "read":
-                    response = client.read_measurement()
-                    if response["status"] == "success":
-                        data = response["data"]
-                        print(f"  V: {data['voltage']:.6f}V, I: {data['current']:.9f}A")
-                elif cmd.startswith("output "):
-                    state = cmd.split()[1].upper()
-                    response = client.set_output(state)
-                    print(f"  {response['message']}")
-                elif cmd.startswith("write "):
-                    scpi_cmd = cmd[6:]  # Remove "write "
-                    response = client.write_command(scpi_cmd)
-                    print(f"  {response['message']}")
-                elif cmd.startswith("query "):
-                    scpi_cmd = cmd[6:]  # Remove "query "
-                    response = client.query_command(scpi_cmd)
-                    if response["status"] == "success":
-                        print(f"  {response['data']}")
-                    else:
-                        print(f"  Error: {response['message']}")
-                elif cmd.startswith("vsource "):
-                    voltage = float(cmd.split()[1])
-                    response = client.setup_voltage_source(voltage=voltage)
-                    print(f"  {response['message']}")
-                elif cmd.startswith("isource "):
-                    current = float(cmd.split()[1])
-                    response = client.setup_current_source(current=current)
-                    print(f"  {response['message']}")
-                elif cmd == "sweep":
-                    response = client.voltage_sweep(start=0, stop=5, steps=11)
-                    if response["status"] == "success":
-                        print(f"  Sweep completed: {len(response['data'])} points")
-                    else:
-                        print(f"  Error: {response['message']}")
-                else:
+                handler = INTERACTIVE_COMMANDS.get(name)
+                if handler is None:
                     print("  Unknown command")
+                    continue
+                handler(client, tokens[1] if len(tokens) > 1 else "")
                     
             except KeyboardInterrupt:
                 break
             except Exception as e:
                 print(f"  Error: {e}")
-                
-    finally:
-        client.disconnect()
 
 def main():
     import argparse
     
     parser = argparse.ArgumentParser(description='Keithley 2400 Client')
-    parser.add_argument('--host', default='localhost', help='Server host')
+    parser.add_argument('--host', default='localhost', help="Server host, or 'unix:/path' for a local socket")
     parser.add_argument('--port', type=int, default=8888, help='Server port')
-    parser.add_argument('--demo', choices=['basic', 'sweep', 'current', 'interactive'], 
+    parser.add_argument('--demo', choices=['basic', 'sweep', 'current', 'pipeline', 'interactive'], 
                        help='Run demo mode')
+    parser.add_argument('--headless', action='store_true', help='Save the sweep plot to iv.png instead of opening a window')
     
     args = parser.parse_args()
+    client_pool.host = args.host
+    client_pool.port = args.port
     
     if args.demo == 'basic':
         demo_basic_operations()
     elif args.demo == 'sweep':
-        demo_voltage_sweep()
+        demo_voltage_sweep(args.headless)
     elif args.demo == 'current':
         demo_current_source()
+    elif args.demo == 'pipeline':
+        demo_pipelined_reads(host=args.host, port=args.port)
     elif args.demo == 'interactive':
         interactive_mode()
     else:
         print("Keithley 2400 Client")
-        print("Use --demo [basic|sweep|current|interactive] to run demos")
+        print("Use --demo [basic|sweep|current|pipeline|interactive] to run demos")
         print("Or create your own client using the Keithley2400Client class")
 
 if __name__ == "__main__":
@@ -2,35 +2,109 @@
 """
 Keithley 2400 SourceMeter Server - Optimized for High-Rate Polling
 Provides TCP server interface for remote control of Keithley 2400
+
+Clients are served from asyncio event loops (uvloop when installed), one by
+default or several sharing the port via SO_REUSEPORT; blocking VISA calls run
+on a single worker thread.
 """
 
+import asyncio
+import functools
+import os
 import socket
+import struct
 import threading
 import json
 import time
 import pyvisa
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+try:
+    import uvloop  # libuv-based event loop; the default asyncio loop is used without it
+except ImportError:
+    uvloop = None
+
+try:
+    import orjson  # C JSON codec: parses bytes directly and serializes straight to bytes
+    json_dumps = orjson.dumps
+    json_loads = orjson.loads  # orjson.JSONDecodeError subclasses json.JSONDecodeError
+except ImportError:
+    _json_encode = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False).encode
+    json_loads = json.loads
+    def json_dumps(obj):
+        return _json_encode(obj).encode('utf-8')
+
 # Setup logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logging.basicConfig(level=logging.INFO, format='%(asctime).19s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Length-prefixed framing: 4-byte big-endian payload length before each JSON message.
+# Legacy clients send bare JSON, which starts with '{' or whitespace; a valid length
+# prefix never does, so the first byte of a connection selects the framing.
+FRAME_HEADER = struct.Struct('>I')
+MAX_FRAME_BYTES = 1 << 20  # Longer frames are rejected: the peer is not speaking this protocol
+
+# Clients polling within this window share one :READ? instead of each hitting GPIB
+READ_CACHE_TTL_S = 0.05
+
+# Output format read_values() relies on in fast mode; re-sent after raw client writes,
+# which may reset it (*RST) or change it (:FORM ...)
+FAST_READ_FORMAT = ';'.join([
+    ':FORM:ELEM VOLT,CURR',  # Only voltage and current
+    ':FORM:DATA REAL,32',  # Binary IEEE-754 floats instead of ASCII
+    ':FORM:BORD SWAP',  # Little-endian byte order
+])
+
+# Fast-mode instrument settings, sent as one compound SCPI write (one bus turnaround)
+FAST_MODE_SETUP = ';'.join([
+    ':SYST:AZER OFF',  # Disable auto-zero for speed
+    ':DISP:ENAB OFF',  # Disable display updates for speed
+    ':SENS:FUNC:CONC ON',  # Concurrent functions
+    FAST_READ_FORMAT,
+])
+NORMAL_MODE_SETUP = ':SYST:AZER ON;:DISP:ENAB ON;:FORM:DATA ASC'
+
+# Performance statistics are logged at most this often, from the read path
+STATS_INTERVAL_S = 30.0
+
+# Below this current the fast read reports an open circuit instead of dividing
+MIN_CURRENT_A = 1e-12
+OPEN_CIRCUIT_OHMS = 1e9
+
+# get_status answers :OUTP?/:SOUR:FUNC? from cache for this long; commands that
+# can change either drop the cached values
+STATUS_CACHE_TTL_S = 0.5
+STATUS_MUTATING_COMMANDS = {'write', 'output', 'setup_voltage_source', 'setup_current_source',
+                            'voltage_sweep', 'reset', 'set_fast_mode'}
+
 class Keithley2400Server:
-    def __init__(self, host='localhost', port=8888, gpib_address='GPIB1::24::INSTR', fast_mode=True):
+    def __init__(self, host='localhost', port=8888, gpib_address='GPIB1::24::INSTR', fast_mode=True, unix_path=None,
+                 event_loops=1, continuous=False):
         self.host = host
         self.port = port
+        self.unix_path = unix_path  # Optional Unix-domain listener for co-located clients
+        self.event_loops = event_loops  # >1 spreads connections over loops via SO_REUSEPORT
         self.gpib_address = gpib_address
         self.fast_mode = fast_mode  # Enable optimizations for high-rate polling
+        self.continuous = continuous  # Fast-mode reads :FETC? from a free-running trigger model
+        self._fetch_primed = False  # True while the trigger model is running after a read
         self.instrument = None
-        self.server_socket = None
         self.running = False
-        self.clients = []
+        self.clients = set()  # Stream writers of connected clients
+        self._stops = []  # (event loop, stop event) for every running loop
+        self._visa_executor = None
+        self._read_lock = threading.Lock()
+        self._read_inflight = None  # Future of the :READ? currently on the VISA worker
+        self._read_cache = (0.0, None)  # (monotonic time, last successful read response)
+        self._read_generation = 0  # Bumped by every non-read command; older reads are not cached
+        self._status_cache = {}  # key -> (query reply, monotonic deadline)
         
         # Performance tracking
         self.read_count = 0
         self.error_count = 0
-        self.last_stats_time = time.time()
+        self.last_stats_time = time.monotonic()
         
         # Connect to instrument
         self.connect_instrument()
@@ -44,186 +118,328 @@ class Keithley2400Server:
             # Optimize timeouts for fast polling
             if self.fast_mode:
                 self.instrument.timeout = 1000  # 1 second - faster timeout
-                # Configure instrument for faster operation
-                self.instrument.write(':SYST:AZER OFF')  # Disable auto-zero for speed
-                self.instrument.write(':DISP:ENAB OFF')  # Disable display updates for speed
             else:
                 self.instrument.timeout = 5000  # 5 seconds - standard timeout
             
             # Test connection
             idn = self.instrument.query('*IDN?').strip()
-            logger.info(f"Connected to: {idn}")
+            logger.info("Connected to: %s", idn)
             
             # Initialize instrument
-            self.instrument.write('*RST')
-            self.instrument.write('*CLS')
+            self.instrument.write('*RST;*CLS')
             
             if self.fast_mode:
                 logger.info("Fast mode enabled - optimized for high-rate polling")
-                # Set up for continuous measurements
-                self.instrument.write(':SENS:FUNC:CONC ON')  # Concurrent functions
-                self.instrument.write(':FORM:ELEM VOLT,CURR')  # Only voltage and current
+                # Configure instrument for faster operation (after *RST, which would undo it)
+                self.instrument.write(FAST_MODE_SETUP)
             
         except Exception as e:
-            logger.error(f"Failed to connect to instrument: {e}")
+            logger.error("Failed to connect to instrument: %s", e)
             raise
             
     def start_server(self):
         """Start the TCP server"""
+        if uvloop is not None:
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        # The instrument handles one request at a time, so a single worker thread
+        # runs every blocking VISA call while the event loops keep serving sockets
+        self._visa_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='visa')
+        self.running = True
+        
+        # Extra loops each own a listener on the same port; the kernel spreads accepts
+        reuse_port = self.event_loops > 1 and hasattr(socket, 'SO_REUSEPORT')
+        if self.event_loops > 1 and not reuse_port:
+            logger.warning("SO_REUSEPORT not available; serving from a single event loop")
+        threads = []
+        for index in range(1, self.event_loops if reuse_port else 1):
+            thread = threading.Thread(target=self._run_loop, args=(index, reuse_port), daemon=True)
+            thread.start()
+            threads.append(thread)
+            
         try:
-            self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            self.server_socket.bind((self.host, self.port))
-            self.server_socket.listen(5)
+            self._run_loop(0, reuse_port)
+        finally:
+            self.stop_server()
+            for thread in threads:
+                thread.join(timeout=1.0)
+            self._visa_executor.shutdown(wait=False)
+            self.cleanup()
             
-            self.running = True
-            logger.info(f"Keithley 2400 Server started on {self.host}:{self.port}")
+    def _run_loop(self, index, reuse_port):
+        """Run one event loop until stop_server() is called"""
+        try:
+            asyncio.run(self._serve(index, reuse_port))
+        except Exception as e:
+            logger.error("Server error: %s", e)
+            
+    async def _serve(self, index, reuse_port):
+        """Run this loop's listeners until stop_server() is called"""
+        stop = asyncio.Event()
+        self._stops.append((asyncio.get_running_loop(), stop))
+        
+        servers = [await asyncio.start_server(self._handle, self.host, self.port,
+                                              reuse_address=True, reuse_port=reuse_port, backlog=5)]
+        if index == 0:
+            logger.info("Keithley 2400 Server started on %s:%s", self.host, self.port)
             if self.fast_mode:
                 logger.info("Server optimized for 250ms polling rate")
-            
-            # Start statistics reporting thread
-            stats_thread = threading.Thread(target=self.stats_reporter)
-            stats_thread.daemon = True
-            stats_thread.start()
-            
-            while self.running:
-                try:
-                    client_socket, address = self.server_socket.accept()
-                    logger.info(f"Client connected from {address}")
-                    
-                    client_thread = threading.Thread(
-                        target=self.handle_client,
-                        args=(client_socket, address)
-                    )
-                    client_thread.daemon = True
-                    client_thread.start()
-                    
-                except Exception as e:
-                    if self.running:
-                        logger.error(f"Error accepting connection: {e}")
-                        
-        except Exception as e:
-            logger.error(f"Server error: {e}")
-        finally:
-            self.cleanup()
-    
-    def stats_reporter(self):
-        """Report performance statistics every 30 seconds"""
-        while self.running:
-            time.sleep(30)
-            if self.read_count > 0:
-                elapsed = time.time() - self.last_stats_time
-                rate = self.read_count / elapsed
-                error_rate = (self.error_count / self.read_count) * 100 if self.read_count > 0 else 0
-                logger.info(f"Performance: {rate:.1f} reads/sec, {error_rate:.1f}% errors")
+            if reuse_port:
+                logger.info("Serving from %s event loops", self.event_loops)
+                
+        # Parallel Unix-domain listener; TCP stays available for remote and C++ clients
+        unix_server = None
+        if index == 0 and self.unix_path and hasattr(asyncio, 'start_unix_server'):
+            try:
+                if os.path.exists(self.unix_path):
+                    os.unlink(self.unix_path)  # Stale socket left by a previous run
+                unix_server = await asyncio.start_unix_server(self._handle, self.unix_path)
+                servers.append(unix_server)
+                logger.info("Unix-domain listener started on %s", self.unix_path)
+            except Exception as e:
+                logger.error("Unix-domain listener error: %s", e)
                 
-                # Reset counters
-                self.read_count = 0
-                self.error_count = 0
-                self.last_stats_time = time.time()
+        try:
+            await stop.wait()
+        finally:
+            for server in servers:
+                server.close()
+            if unix_server is not None:
+                try:
+                    os.unlink(self.unix_path)
+                except OSError:
+                    pass
             
-    def handle_client(self, client_socket, address):
+    def _flush_stats(self, now):
+        """Report performance statistics and reset the counters"""
+        elapsed = now - self.last_stats_time
+        rate = self.read_count / elapsed
+        error_rate = (self.error_count / self.read_count) * 100 if self.read_count > 0 else 0
+        logger.info("Performance: %.1f reads/sec, %.1f%% errors", rate, error_rate)
+        
+        # Reset counters
+        self.read_count = 0
+        self.error_count = 0
+        self.last_stats_time = now
+            
+    async def _handle(self, reader, writer):
         """Handle individual client connection"""
-        self.clients.append(client_socket)
+        address = writer.get_extra_info('peername') or self.unix_path
+        logger.info("Client connected from %s", address)
+        self.clients.add(writer)
+        
+        sock = writer.get_extra_info('socket')
+        if sock is not None and sock.family in (socket.AF_INET, socket.AF_INET6):
+            # Small 250 ms-cadence replies must not wait on Nagle or a delayed ACK
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            if hasattr(socket, 'TCP_QUICKACK'):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
         
         try:
+            # The first byte picks framed or legacy bare-JSON mode
+            pending = await reader.read(1)
+            framed = bool(pending) and pending != b'{' and not pending.isspace()
+            
             while self.running:
                 # Receive command from client
-                data = client_socket.recv(1024).decode('utf-8')
-                if not data:
-                    break
+                if framed:
+                    header = pending + await reader.readexactly(FRAME_HEADER.size - len(pending))
+                    length = FRAME_HEADER.unpack(header)[0]
+                    if length > MAX_FRAME_BYTES:
+                        logger.warning("Client %s sent a %d-byte frame; closing connection", address, length)
+                        break
+                    data = await reader.readexactly(length)
+                else:
+                    data = pending + await reader.read(1024 - len(pending))
+                    if not data:
+                        break
+                pending = b''
                     
                 try:
-                    # Parse JSON command
-                    command = json.loads(data)
+                    # Parse JSON command straight from the received bytes
+                    command = json_loads(data)
                     # Reduce logging for read commands to avoid spam
                     if command.get('type') != 'read':
-                        logger.info(f"Command from {address}: {command}")
-                    
-                    # Process command
-                    response = self.process_command(command)
+                        logger.info("Command from %s: %s", address, command)
                     
-                    # Send response back to client
-                    response_json = json.dumps(response)
-                    client_socket.send(response_json.encode('utf-8'))
+                    # Process command on the VISA worker thread
+                    if command.get('type') == 'read':
+                        response = await self._coalesced_read(command)
+                    else:
+                        # Any other command may change what a read returns
+                        self._read_generation += 1
+                        self._read_cache = (0.0, None)
+                        response = await asyncio.get_running_loop().run_in_executor(
+                            self._visa_executor, self.process_command, command)
+                    # Echo the request id so pipelining clients can match responses
+                    if 'id' in command:
+                        response['id'] = command['id']
                     
                 except json.JSONDecodeError:
-                    error_response = {"status": "error", "message": "Invalid JSON format"}
-                    client_socket.send(json.dumps(error_response).encode('utf-8'))
+                    response = {"status": "error", "message": "Invalid JSON format"}
                     
                 except Exception as e:
-                    error_response = {"status": "error", "message": str(e)}
-                    client_socket.send(json.dumps(error_response).encode('utf-8'))
-                    logger.error(f"Error processing command: {e}")
+                    response = {"status": "error", "message": str(e)}
+                    logger.error("Error processing command: %s", e)
                     
+                # Send response back to client
+                self.send_response(writer, response, framed)
+                await writer.drain()
+                
+        except asyncio.IncompleteReadError:
+            pass  # Peer closed mid-frame or between frames
+        except asyncio.CancelledError:
+            pass  # Server shutting down; nothing awaits this handler
         except Exception as e:
-            logger.error(f"Client {address} error: {e}")
+            logger.error("Client %s error: %s", address, e)
         finally:
-            client_socket.close()
-            if client_socket in self.clients:
-                self.clients.remove(client_socket)
-            logger.info(f"Client {address} disconnected")
+            writer.close()
+            self.clients.discard(writer)
+            logger.info("Client %s disconnected", address)
+            
+    async def _coalesced_read(self, command):
+        """Serve a read from the recent cache, or join the :READ? already in flight"""
+        cached_at, cached = self._read_cache
+        if cached is not None and time.monotonic() - cached_at < READ_CACHE_TTL_S:
+            return dict(cached)
             
+        # The in-flight read is a concurrent future so clients on any event loop can share it
+        with self._read_lock:
+            future = self._read_inflight
+            if future is None:
+                future = self._visa_executor.submit(self.process_command, command)
+                self._read_inflight = future
+                future.add_done_callback(functools.partial(self._read_done, self._read_generation))
+        # Shield so one client disconnecting does not cancel the read for the others;
+        # copy so each client's id is added to its own response
+        return dict(await asyncio.shield(asyncio.wrap_future(future)))
+        
+    def _read_done(self, generation, future):
+        """Clear the in-flight read and cache it if it succeeded and no command ran since it was submitted"""
+        self._read_inflight = None
+        if generation != self._read_generation:
+            return  # A setup command may have changed what this read measured
+        if not future.cancelled() and future.exception() is None:
+            response = future.result()
+            if response.get('status') == 'success':
+                self._read_cache = (time.monotonic(), response)
+                
+    def send_response(self, writer, response, framed):
+        """Serialize a response and queue all of it, length-prefixed if the client uses framing"""
+        payload = json_dumps(response)
+        if framed:
+            payload = FRAME_HEADER.pack(len(payload)) + payload
+        writer.write(payload)
+            
+    def read_values(self):
+        """Trigger :READ? and return its values as floats (binary transfer in fast mode)"""
+        if self.fast_mode:
+            # While free-running the instrument is already measuring; just fetch the newest reading
+            query = ':FETC?' if self._fetch_primed else ':READ?'
+            return self.instrument.query_binary_values(query, datatype='f', is_big_endian=False)
+        return self.instrument.query_ascii_values(':READ?', separator=',')
+        
+    def _start_continuous(self):
+        """Leave the trigger model running so later reads can :FETC? instead of :READ?"""
+        self.instrument.write(':ARM:COUN INF;:INIT')
+        self._fetch_primed = True
+        
+    def _stop_continuous(self):
+        """Abort the free-running trigger model before the instrument is reconfigured"""
+        self._fetch_primed = False
+        self.instrument.write(':ABOR;:ARM:COUN 1')
+        
+    def _cached_query(self, key, scpi_cmd, ttl=STATUS_CACHE_TTL_S):
+        """Query the instrument, reusing the reply cached under key until its TTL expires"""
+        now = time.monotonic()
+        entry = self._status_cache.get(key)
+        if entry is not None and now < entry[1]:
+            return entry[0]
+        value = self.instrument.query(scpi_cmd).strip()
+        self._status_cache[key] = (value, now + ttl)
+        return value
+        
     def process_command(self, command):
         """Process instrument command"""
         cmd_type = command.get('type', '')
         cmd_data = command.get('data', {})
         
+        if cmd_type in STATUS_MUTATING_COMMANDS:
+            self._status_cache.pop('OUTP', None)
+            self._status_cache.pop('FUNC', None)
+        
         try:
+            # Anything other than a read may reconfigure the instrument; measure on demand again
+            if self._fetch_primed and cmd_type != 'read':
+                self._stop_continuous()
+                
+
             if cmd_type == 'write':
                 # Write command to instrument
                 scpi_cmd = cmd_data.get('command', '')
                 self.instrument.write(scpi_cmd)
+                if self.fast_mode:
+                    self.instrument.write(FAST_READ_FORMAT)  # Keep binary reads working after e.g. *RST
                 return {"status": "success", "message": f"Command '{scpi_cmd}' executed"}
                 
             elif cmd_type == 'query':
                 # Query instrument
                 scpi_cmd = cmd_data.get('command', '')
-                result = self.instrument.query(scpi_cmd).strip()
+                if self.fast_mode:
+                    # Fast mode transfers readings as binary REAL,32 for read_values(); switch to ASCII
+                    # around raw queries so :READ?/:MEAS?/:FETC? still come back as text
+                    self.instrument.write(':FORM:DATA ASC')
+                    try:
+                        result = self.instrument.query(scpi_cmd).strip()
+                    finally:
+                        self.instrument.write(FAST_READ_FORMAT)
+                else:
+                    result = self.instrument.query(scpi_cmd).strip()
                 return {"status": "success", "data": result}
                 
             elif cmd_type == 'read':
                 # Take measurement - optimized for fast polling
+                # Statistics are reported from here; reads all run on the VISA worker thread
+                now = time.monotonic()
+                if now - self.last_stats_time >= STATS_INTERVAL_S and self.read_count > 0:
+                    self._flush_stats(now)
                 self.read_count += 1
-                start_time = time.time()
+                # Integer epoch ns is a cheap clock read; perf_counter times the query itself
+                now_ns = time.time_ns()
+                start_time = time.perf_counter()
                 
                 try:
                     if self.fast_mode:
                         # Fast method: Read only voltage and current
                         # Use a single query that returns both values
-                        result = self.instrument.query(':READ?').strip()
-                        values = result.split(',')
-                        
-                        voltage = float(values[0])
-                        current = float(values[1])
+                        values = self.read_values()
+                        voltage, current = values[0], values[1]
+                        if self.continuous and not self._fetch_primed:
+                            self._start_continuous()
                         
-                        # Calculate derived values
-                        if abs(current) > 1e-12:  # Avoid division by zero
-                            resistance = voltage / current
+                        # Calculate derived values; a chained compare avoids the abs() call
+                        if -MIN_CURRENT_A <= current <= MIN_CURRENT_A:
+                            resistance = OPEN_CIRCUIT_OHMS  # Avoid division by zero
                         else:
-                            resistance = 1e9  # Very high resistance for open circuit
-                            
-                        power = voltage * current
+                            resistance = voltage / current
                         
                         measurement = {
                             "voltage": voltage,
                             "current": current,
                             "resistance": resistance,
-                            "power": power,
-                            "timestamp": datetime.now().isoformat(),
-                            "read_time_ms": (time.time() - start_time) * 1000
+                            "power": voltage * current,
+                            "timestamp_ns": now_ns,
+                            "read_time_ms": (time.perf_counter() - start_time) * 1000
                         }
                     else:
                         # Standard method: Full read with all values
-                        result = self.instrument.query(':READ?').strip()
-                        values = result.split(',')
+                        values = self.read_values()
                         measurement = {
-                            "voltage": float(values[0]),
-                            "current": float(values[1]),
-                            "resistance": float(values[2]) if len(values) > 2 else None,
-                            "power": float(values[3]) if len(values) > 3 else None,
-                            "timestamp": datetime.now().isoformat(),
-                            "read_time_ms": (time.time() - start_time) * 1000
+                            "voltage": values[0],
+                            "current": values[1],
+                            "resistance": values[2] if len(values) > 2 else None,
+                            "power": values[3] if len(values) > 3 else None,
+                            "timestamp_ns": now_ns,
+                            "read_time_ms": (time.perf_counter() - start_time) * 1000
                         }
                     
                     return {"status": "success", "data": measurement}
@@ -231,14 +447,16 @@ class Keithley2400Server:
                 except Exception as e:
                     self.error_count += 1
                     error_msg = str(e)
+                    if self._fetch_primed:
+                        self._stop_continuous()  # Fall back to :READ? until a read succeeds again
                     
                     # Don't spam logs with timeout errors during fast polling
                     if "timeout" in error_msg.lower() or "VI_ERROR_TMO" in error_msg:
                         # Only log every 20th timeout to reduce spam
                         if self.error_count % 20 == 1:
-                            logger.warning(f"Read timeout (x{self.error_count}): {error_msg}")
+                            logger.warning("Read timeout (x%s): %s", self.error_count, error_msg)
                     else:
-                        logger.error(f"Read measurement failed: {error_msg}")
+                        logger.error("Read measurement failed: %s", error_msg)
                     
                     return {"status": "error", "message": error_msg}
                 
@@ -248,13 +466,11 @@ class Keithley2400Server:
                 range_val = cmd_data.get('range', 'AUTO')
                 compliance = cmd_data.get('compliance', 0.1)
                 
-                self.instrument.write(':SOUR:FUNC VOLT')
-                self.instrument.write(':SOUR:VOLT:MODE FIXED')
-                self.instrument.write(f':SOUR:VOLT {voltage}')
+                scpi = [':SOUR:FUNC VOLT', ':SOUR:VOLT:MODE FIXED', f':SOUR:VOLT {voltage}']
                 if range_val != 'AUTO':
-                    self.instrument.write(f':SOUR:VOLT:RANG {range_val}')
-                self.instrument.write(':SENS:FUNC "CURR"')
-                self.instrument.write(f':SENS:CURR:PROT {compliance}')
+                    scpi.append(f':SOUR:VOLT:RANG {range_val}')
+                scpi += [':SENS:FUNC "CURR"', f':SENS:CURR:PROT {compliance}']
+                self.instrument.write(';'.join(scpi))
                 
                 return {"status": "success", "message": f"Voltage source setup: {voltage}V, compliance: {compliance}A"}
                 
@@ -264,13 +480,11 @@ class Keithley2400Server:
                 range_val = cmd_data.get('range', 'AUTO')
                 compliance = cmd_data.get('compliance', 10)
                 
-                self.instrument.write(':SOUR:FUNC CURR')
-                self.instrument.write(':SOUR:CURR:MODE FIXED')
-                self.instrument.write(f':SOUR:CURR {current}')
+                scpi = [':SOUR:FUNC CURR', ':SOUR:CURR:MODE FIXED', f':SOUR:CURR {current}']
                 if range_val != 'AUTO':
-                    self.instrument.write(f':SOUR:CURR:RANG {range_val}')
-                self.instrument.write(':SENS:FUNC "VOLT"')
-                self.instrument.write(f':SENS:VOLT:PROT {compliance}')
+                    scpi.append(f':SOUR:CURR:RANG {range_val}')
+                scpi += [':SENS:FUNC "VOLT"', f':SENS:VOLT:PROT {compliance}']
+                self.instrument.write(';'.join(scpi))
                 
                 return {"status": "success", "message": f"Current source setup: {current}A, compliance: {compliance}V"}
                 
@@ -289,38 +503,34 @@ class Keithley2400Server:
                 delay = cmd_data.get('delay', 0.1)
                 
                 # Setup
-                self.instrument.write(':SOUR:FUNC VOLT')
-                self.instrument.write(':SOUR:VOLT:MODE FIXED')
-                self.instrument.write(':SENS:FUNC "CURR"')
-                self.instrument.write(f':SENS:CURR:PROT {compliance}')
-                self.instrument.write(':OUTP ON')
+                self.instrument.write(f':SOUR:FUNC VOLT;:SOUR:VOLT:MODE FIXED;:SENS:FUNC "CURR";:SENS:CURR:PROT {compliance};:OUTP ON')
                 
-                # Perform sweep
-                voltages = [start_v + i * (stop_v - start_v) / (steps - 1) for i in range(steps)]
-                results = []
+                # Perform sweep: step computed once, results list sized up front
+                step = (stop_v - start_v) / (steps - 1)
+                results = [None] * steps
                 
-                for voltage in voltages:
+                for i in range(steps):
+                    voltage = start_v + i * step
                     self.instrument.write(f':SOUR:VOLT {voltage}')
                     time.sleep(delay)
                     
-                    reading = self.instrument.query(':READ?').strip()
-                    values = reading.split(',')
+                    values = self.read_values()
                     
-                    results.append({
+                    results[i] = {
                         "set_voltage": voltage,
-                        "measured_voltage": float(values[0]),
-                        "measured_current": float(values[1]),
-                        "timestamp": datetime.now().isoformat()
-                    })
+                        "measured_voltage": values[0],
+                        "measured_current": values[1],
+                        "timestamp_ns": time.time_ns()
+                    }
                 
                 self.instrument.write(':OUTP OFF')
                 return {"status": "success", "data": results}
                 
             elif cmd_type == 'get_status':
                 # Get instrument status
-                idn = self.instrument.query('*IDN?').strip()
-                output_state = self.instrument.query(':OUTP?').strip()
-                source_func = self.instrument.query(':SOUR:FUNC?').strip()
+                idn = self._cached_query('IDN', '*IDN?', float('inf'))  # Hardware id never changes
+                output_state = self._cached_query('OUTP', ':OUTP?')
+                source_func = self._cached_query('FUNC', ':SOUR:FUNC?')
                 
                 status = {
                     "instrument": idn,
@@ -335,30 +545,24 @@ class Keithley2400Server:
                 
             elif cmd_type == 'reset':
                 # Reset instrument
-                self.instrument.write('*RST')
-                self.instrument.write('*CLS')
+                self.instrument.write('*RST;*CLS')
                 
                 # Re-apply fast mode settings after reset
                 if self.fast_mode:
                     time.sleep(0.1)  # Wait for reset to complete
-                    self.instrument.write(':SYST:AZER OFF')
-                    self.instrument.write(':DISP:ENAB OFF')
-                    self.instrument.write(':SENS:FUNC:CONC ON')
-                    self.instrument.write(':FORM:ELEM VOLT,CURR')
+                    self.instrument.write(FAST_MODE_SETUP)
                 
                 return {"status": "success", "message": "Instrument reset"}
                 
+            elif cmd_type == 'batch':
+                # Run sub-commands in order and return all responses in one reply
+                responses = [self.process_command(sub_command) for sub_command in cmd_data.get('commands', [])]
+                return {"status": "success", "data": responses}
+                
             elif cmd_type == 'set_fast_mode':
                 # Enable/disable fast mode
                 self.fast_mode = cmd_data.get('enabled', True)
-                if self.fast_mode:
-                    self.instrument.write(':SYST:AZER OFF')
-                    self.instrument.write(':DISP:ENAB OFF')
-                    self.instrument.write(':SENS:FUNC:CONC ON')
-                    self.instrument.write(':FORM:ELEM VOLT,CURR')
-                else:
-                    self.instrument.write(':SYST:AZER ON')
-                    self.instrument.write(':DISP:ENAB ON')
+                self.instrument.write(FAST_MODE_SETUP if self.fast_mode else NORMAL_MODE_SETUP)
                 
                 return {"status": "success", "message": f"Fast mode {'enabled' if self.fast_mode else 'disabled'}"}
                 
@@ -372,28 +576,16 @@ class Keithley2400Server:
         """Cleanup resources"""
         self.running = False
         
-        # Close all client connections
-        for client in self.clients:
-            try:
-                client.close()
-            except:
-                pass
-                
-        # Close server socket
-        if self.server_socket:
-            try:
-                self.server_socket.close()
-            except:
-                pass
-                
         # Close instrument connection
         if self.instrument:
             try:
-                self.instrument.write(':OUTP OFF')  # Safety: turn output off
+                if self._fetch_primed:
+                    self._stop_continuous()
                 if self.fast_mode:
-                    # Restore normal settings
-                    self.instrument.write(':SYST:AZER ON')
-                    self.instrument.write(':DISP:ENAB ON')
+                    # Safety: turn output off, and restore normal settings
+                    self.instrument.write(':OUTP OFF;' + NORMAL_MODE_SETUP)
+                else:
+                    self.instrument.write(':OUTP OFF')  # Safety: turn output off
                 self.instrument.close()
             except:
                 pass
@@ -403,8 +595,11 @@ class Keithley2400Server:
     def stop_server(self):
         """Stop the server"""
         self.running = False
-        if self.server_socket:
-            self.server_socket.close()
+        for loop, stop in self._stops:
+            try:
+                loop.call_soon_threadsafe(stop.set)
+            except RuntimeError:
+                pass  # Loop already closed
 
 def main():
     import argparse
@@ -412,16 +607,20 @@ def main():
     parser = argparse.ArgumentParser(description='Keithley 2400 Server - Optimized for High-Rate Polling')
     parser.add_argument('--host', default='127.0.0.101', help='Server host')
     parser.add_argument('--port', type=int, default=8888, help='Server port')
+    parser.add_argument('--unix', default=None, help='Also listen on this Unix-domain socket path (e.g. /tmp/keithley.sock)')
+    parser.add_argument('--loops', type=int, default=1, help='Event loops sharing the port via SO_REUSEPORT (default: 1)')
     parser.add_argument('--gpib', default='GPIB1::24::INSTR', help='GPIB address')
     parser.add_argument('--fast', action='store_true', default=True, help='Enable fast mode (default: True)')
     parser.add_argument('--no-fast', action='store_true', help='Disable fast mode')
+    parser.add_argument('--continuous', action='store_true',
+                        help='Fast mode: keep the instrument measuring and poll with :FETC? instead of :READ?')
     
     args = parser.parse_args()
     
     # Handle fast mode flags
     fast_mode = args.fast and not args.no_fast
     
-    server = Keithley2400Server(args.host, args.port, args.gpib, fast_mode)
+    server = Keithley2400Server(args.host, args.port, args.gpib, fast_mode, args.unix, args.loops, args.continuous)
     
     try:
         server.start_server()
@@ -1,17 +1,136 @@
 import pyvisa
 import socket
+import struct
+
+# Optional length-prefixed framing: 4-byte big-endian length before each message.
+# Legacy clients send bare text commands, which never start with a zero byte; a length
+# prefix for any real command does, so the first byte picks the mode.
+FRAME_HEADER = struct.Struct('>I')
+MAX_FRAME_BYTES = 1 << 16  # Longer frames are rejected: the peer is not speaking this protocol
+
+def recv_exact(conn, view, n):
+    """Receive exactly n bytes into view, or return None if the peer closed the connection"""
+    view = view[:n]
+    got = 0
+    while got < n:
+        count = conn.recv_into(view[got:])
+        if not count:
+            return None
+        got += count
+    return view
+
+# Framed replies are a status byte followed by the raw SCPI reply or error text;
+# legacy text clients get the labelled response they always have
+STATUS_OK = b'\x00'
+STATUS_ERR = b'\x01'
+
+def send_response(conn, response, framed):
+    """Send a text (error) response; framed clients get it as a STATUS_ERR frame"""
+    if framed:
+        send_frame(conn, STATUS_ERR + response.encode())
+    else:
+        conn.sendall(response.encode())
+
+def send_frame(conn, payload):
+    """Send one length-prefixed frame"""
+    conn.sendall(FRAME_HEADER.pack(len(payload)) + payload)
+
+class CommandError(Exception):
+    """A handler failure whose message is sent back to the client as-is"""
+
+def query_raw(instr, scpi):
+    """Query the instrument and return the reply bytes undecoded"""
+    instr.write(scpi)
+    return instr.read_raw()
+
+def set_laser_current(instr, value):
+    instr.write(f"source1:current:level:amplitude {value}")
+    return query_raw(instr, 'source1:current:level:amplitude?')
+
+def set_tec_temperature(instr, value):
+    instr.write(f"source2:temperature:spoint {value}")
+    return query_raw(instr, 'source2:temperature:spoint?')
+
+def laser_on(instr, value):
+    instr.write("output1:state on")
+    return query_raw(instr, 'output1:state?')
+
+def laser_off(instr, value):
+    instr.write("output1:state off")
+    return query_raw(instr, 'output1:state?')
+
+def tec_on(instr, value):
+    instr.write("output2:state on")
+    return query_raw(instr, 'output2:state?')
+
+def tec_off(instr, value):
+    instr.write("output2:state off")
+    return query_raw(instr, 'output2:state?')
+
+def read_laser_current(instr, value):
+    return query_raw(instr, "sense3:current:dc:data?")
+
+def read_tec_temperature(instr, value):
+    try:
+        return query_raw(instr, "SENSe2:temperature:data?")
+    except pyvisa.errors.VisaIOError as e:
+        if "timeout" in str(e).lower():
+            raise CommandError("ERROR: Temperature reading timeout")
+        raise CommandError(f"ERROR: VISA error - {str(e)}")
+
+# Command name -> (text label for legacy clients, handler(instr, value) returning the raw reply)
+COMMANDS = {
+    "SET_LASER_CURRENT": ("Set LD current [A]", set_laser_current),
+    "SET_TEC_TEMPERATURE": ("Set TEC temperature [C]", set_tec_temperature),
+    "LASER_ON": ("Laser state", laser_on),
+    "LASER_OFF": ("Laser state", laser_off),
+    "TEC_ON": ("TEC state", tec_on),
+    "TEC_OFF": ("TEC state", tec_off),
+    "READ_LASER_CURRENT": ("Current laser current [A]", read_laser_current),
+    "READ_TEC_TEMPERATURE": ("Current TEC temperature [C]", read_tec_temperature),
+}
+# Commands that are ignored unless a value follows them
+VALUE_COMMANDS = {"SET_LASER_CURRENT", "SET_TEC_TEMPERATURE"}
+
+# VISA timeout per command; only changed on the instrument when it differs from the last one
+DEFAULT_TIMEOUT_MS = 1000
+TIMEOUTS = {"READ_TEC_TEMPERATURE": 200}
 
 # Function to handle client requests
 def handle_client(conn, addr, instr):
     print(f"Connected by {addr}")
+    first = conn.recv(1, socket.MSG_PEEK)
+    framed = first == b'\x00'
+    # One receive buffer per connection, reused for every command
+    buf = memoryview(bytearray(4096))
+    timeout = instr.timeout
     while True:
         try:
-            data = conn.recv(1024).decode()
-            if not data:
+            if framed:
+                header = recv_exact(conn, buf, FRAME_HEADER.size)
+                if header is None:
+                    data = None
+                else:
+                    length, = FRAME_HEADER.unpack(header)
+                    if length > MAX_FRAME_BYTES:
+                        print(f"Client {addr} sent a {length}-byte frame; closing connection")
+                        break
+                    if length > len(buf):
+                        buf = memoryview(bytearray(length))
+                    payload = recv_exact(conn, buf, length)
+                    data = None if payload is None else str(payload, 'utf-8')
+            else:
+                count = conn.recv_into(buf[:1024])
+                data = str(buf[:count], 'utf-8') if count else None
+            if data is None:
                 print(f"Client {addr} disconnected gracefully")
                 break
             #print(f"Received command: {data}")
             parts = data.split()
+            if not parts:
+                # Empty frame or whitespace-only message: answer instead of dropping the client
+                send_response(conn, "Unknown command or missing value", framed)
+                continue
             command = parts[0]
             
             if len(parts) > 1:
@@ -20,50 +139,24 @@ def handle_client(conn, addr, instr):
                 value = None
             
             try:
-                if command == "SET_LASER_CURRENT" and value is not None:
-                    instr.write(f"source1:current:level:amplitude {value}")
-                    response = f"Set LD current [A]: {instr.query('source1:current:level:amplitude?')}"
-                elif command == "SET_TEC_TEMPERATURE" and value is not None:
-                    instr.write(f"source2:temperature:spoint {value}")
-                    response = f"Set TEC temperature [C]: {instr.query('source2:temperature:spoint?')}"
-                elif command == "LASER_ON":
-                    instr.write("output1:state on")
-                    response = f"Laser state: {instr.query('output1:state?')}"
-                elif command == "LASER_OFF":
-                    instr.write("output1:state off")
-                    response = f"Laser state: {instr.query('output1:state?')}"
-                elif command == "TEC_ON":
-                    instr.write("output2:state on")
-                    response = f"TEC state: {instr.query('output2:state?')}"
-                elif command == "TEC_OFF":
-                    instr.write("output2:state off")
-                    response = f"TEC state: {instr.query('output2:state?')}"
-                elif command == "READ_LASER_CURRENT":
-                    current = instr.query("sense3:current:dc:data?")
-                    response = f"Current laser current [A]: {current}"
-                elif command == "READ_TEC_TEMPERATURE":
-                    try:
-                        # Store original timeout
-                        original_timeout = instr.timeout
-                        # Set new timeout for temperature reading (2000 ms)
-                        instr.timeout = 200
-                        temp = instr.query("SENSe2:temperature:data?")
-                        response = f"Current TEC temperature [C]: {temp}"
-                    except pyvisa.errors.VisaIOError as e:
-                        if "timeout" in str(e).lower():
-                            response = "ERROR: Temperature reading timeout"
-                        else:
-                            response = f"ERROR: VISA error - {str(e)}"
-                    finally:
-                        # Restore original timeout
-                        instr.timeout = original_timeout
+                entry = COMMANDS.get(command)
+                if entry is None or (value is None and command in VALUE_COMMANDS):
+                    send_response(conn, "Unknown command or missing value", framed)
                 else:
-                    response = "Unknown command or missing value"
-                
-                conn.sendall(response.encode())
+                    label, handler = entry
+                    command_timeout = TIMEOUTS.get(command, DEFAULT_TIMEOUT_MS)
+                    if command_timeout != timeout:
+                        instr.timeout = timeout = command_timeout
+                    reply = handler(instr, value)
+                    if framed:
+                        send_frame(conn, STATUS_OK + reply)
+                    else:
+                        conn.sendall(f"{label}: {reply.decode()}".encode())
+            except CommandError as e:
+                send_response(conn, str(e), framed)
             except pyvisa.errors.VisaIOError as e:
                 error_response = f"ERROR: VISA communication error - {str(e)}"
-                conn.sendall(error_response.encode())
+                send_response(conn, error_response, framed)
                 
         except (ConnectionResetError, ConnectionAbortedError):
             print(f"Client {addr} disconnected forcefully")
@@ -79,7 +172,7 @@ def main():
     rm = pyvisa.ResourceManager()
     instr = rm.open_resource('USB0::0x1313::0x804F::M00930341::INSTR')
     # Set default timeout (optional)
-    instr.timeout = 1000  # 1 second default timeout
+    instr.timeout = DEFAULT_TIMEOUT_MS  # 1 second default timeout
     print("Used device:", instr.query("*IDN?"))
 
     # Setup socket server
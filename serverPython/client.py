@@ -1,3 +1,5 @@
+import codecs
+import select
 import socket
 
 def connect_to_server(host='localhost', port=8888):
@@ -9,15 +11,31 @@ def connect_to_server(host='localhost', port=8888):
     print(f"Connecting to {host}:{port}")
     client_socket.connect(server_address)
     
+    # Keep-alive probes detect a dead server on a quiet connection
+    client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    if hasattr(socket, 'TCP_KEEPIDLE'):  # Linux
+        client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 30)
+        client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 10)
+        client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 3)
+    
+    # Incremental decoder: a multi-byte character split across reads is not lost
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    
     try:
         # Receive and print data from the server
         while True:
-            data = client_socket.recv(1024).decode('utf-8')
+            # Wake up every second so Ctrl-C is handled promptly
+            readable, _, _ = select.select([client_socket], [], [], 1.0)
+            if not readable:
+                continue
+            data = client_socket.recv(1024)
             if not data:
                 break
-            print(f"Received: {data.strip()}")
+            print(f"Received: {decoder.decode(data).strip()}")
     except KeyboardInterrupt:
         print("Client shutting down...")
+    except OSError as e:
+        print(f"Connection lost: {e}")
     finally:
         client_socket.close()
 
@@ -1,5 +1,6 @@
 import pyvisa
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
 def find_gpib_devices():
     """
@@ -59,37 +60,54 @@ def find_gpib_devices():
         print("Make sure you have VISA runtime installed (NI-VISA, Keysight IO Libraries, etc.)")
         sys.exit(1)
 
+def _probe_address(rm, addr):
+    """
+    Probe one GPIB address; returns (addr, idn) or None if nothing answers
+    """
+    resource_name = f"GPIB0::{addr}::INSTR"
+    try:
+        # Short open/IO timeouts bound a dead-address probe to ~150 ms
+        instrument = rm.open_resource(resource_name, open_timeout=100, timeout=150,
+                                      read_termination='\n', write_termination='\n')
+        
+        try:
+            idn = instrument.query('*IDN?').strip()
+        except:
+            # Device responds but not to *IDN?
+            idn = None
+        
+        instrument.close()
+        return (addr, idn)
+        
+    except:
+        # No device at this address (expected for most addresses)
+        return None
+
 def scan_gpib_addresses():
     """
-    Alternative method: Scan specific GPIB addresses (0-30) on primary GPIB interface
+    Alternative method: Scan specific GPIB addresses (0-30) on primary interface
     """
     try:
         rm = pyvisa.ResourceManager()
         print("\nScanning GPIB addresses 0-30 on primary interface:")
         print("-" * 50)
         
+        # Probes mostly wait on VISA timeouts, so run them concurrently
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda addr: _probe_address(rm, addr), range(31)))  # GPIB addresses 0-30
+        
         found_devices = []
         
-        for addr in range(31):  # GPIB addresses 0-30
-            resource_name = f"GPIB0::{addr}::INSTR"
-            try:
-                instrument = rm.open_resource(resource_name)
-                instrument.timeout = 1000  # 1 second timeout for scanning
-                
-                try:
-                    idn = instrument.query('*IDN?').strip()
-                    print(f"  Address {addr:2d}: {idn}")
-                    found_devices.append((addr, idn))
-                except:
-                    # Device responds but not to *IDN?
-                    print(f"  Address {addr:2d}: Device present (no *IDN? response)")
-                    found_devices.append((addr, "Unknown device"))
-                
-                instrument.close()
-                
-            except:
-                # No device at this address (expected for most addresses)
-                pass
+        for result in results:
+            if result is None:
+                continue
+            addr, idn = result
+            if idn is None:
+                print(f"  Address {addr:2d}: Device present (no *IDN? response)")
+                idn = "Unknown device"
+            else:
+                print(f"  Address {addr:2d}: {idn}")
+            found_devices.append((addr, idn))
         
         if not found_devices:
             print("  No devices found on GPIB addresses 0-30")
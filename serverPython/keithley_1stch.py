@@ -1,23 +1,39 @@
+import selectors
 import socket
+import struct
 import threading
 import time
 import pyvisa
 import pyqtgraph as pg
 import numpy as np
 from PyQt5.QtWidgets import QApplication, QVBoxLayout, QWidget
-from PyQt5.QtCore import QObject, pyqtSignal, QTimer
+from PyQt5.QtCore import QObject, pyqtSignal, QTimer, QSocketNotifier
 
 class DataCollector(QObject):
-    data_updated = pyqtSignal(float)
+    data_updated = pyqtSignal(np.ndarray)  # Batch of readings, oldest first
     histogram_updated = pyqtSignal(list)
 
-    def __init__(self, multimeter, parent=None):
+    def __init__(self, multimeter, parent=None, binary_mode=False):
         super().__init__(parent)
         self.multimeter = multimeter
+        # Binary mode sends 4-byte little-endian floats instead of text lines
+        self.binary_mode = binary_mode
+        self._pack = struct.Struct('<f').pack
         self.running = False
         self.clients = []
         self.lock = threading.Lock()  # Lock for thread-safe client list operations
-        self.elapsed_times = []
+        # Elapsed times go into preallocated arrays; the histogram thread swaps the pair
+        self._times = np.empty(4096, dtype=np.float64)
+        self._spare_times = np.empty_like(self._times)
+        self._n = 0
+        # One I/O thread watches every client: reads detect disconnects, writes drain backlogs
+        self.selector = selectors.DefaultSelector()
+        self.pending = {}  # client -> bytearray of bytes the kernel did not accept yet
+        self.removed = []  # Dropped clients still registered; only the I/O thread closes them
+        self.max_pending = 1 << 16  # Drop clients that fall this far behind
+        # Readings are handed to the GUI in batches to cut cross-thread signal traffic
+        self.emit_batch = 5
+        self.emit_interval = 0.1
 
     def start(self):
         self.running = True
@@ -27,12 +43,117 @@ class DataCollector(QObject):
         histogram_thread = threading.Thread(target=self.calculate_histogram)
         histogram_thread.start()
 
+        io_thread = threading.Thread(target=self.serve_clients)
+        io_thread.start()
+
+    def add_client(self, client):
+        client.setblocking(False)
+        with self.lock:
+            self.clients.append(client)
+            self.selector.register(client, selectors.EVENT_READ)
+
+    def remove_client(self, client):
+        # Caller holds self.lock. The socket is closed later by the I/O thread, which may
+        # be inside select() on it right now
+        if client in self.clients:
+            self.clients.remove(client)
+            self.pending.pop(client, None)
+            self.removed.append(client)
+
+    def close_removed(self):
+        # I/O thread only, caller holds self.lock
+        for client in self.removed:
+            self.selector.unregister(client)
+            client.close()
+        self.removed.clear()
+
+    def broadcast(self, msg):
+        with self.lock:
+            for client in self.clients[:]:
+                backlog = self.pending.get(client)
+                if backlog is not None:
+                    # Keep ordering: queue behind what is already waiting
+                    if len(backlog) + len(msg) > self.max_pending:
+                        print("Client too slow, removing from list.")
+                        self.remove_client(client)
+                    else:
+                        backlog += msg
+                    continue
+                try:
+                    sent = client.send(msg)
+                except BlockingIOError:
+                    sent = 0
+                except OSError:
+                    print("Client disconnected unexpectedly, removing from list.")
+                    self.remove_client(client)
+                    continue
+                if sent < len(msg):
+                    self.pending[client] = bytearray(msg[sent:])
+                    self.selector.modify(client, selectors.EVENT_READ | selectors.EVENT_WRITE)
+
+    def serve_clients(self):
+        while self.running:
+            with self.lock:
+                self.close_removed()
+                idle = not self.clients
+            if idle:
+                # select() on Windows rejects an empty socket set; wait for a client instead
+                time.sleep(0.5)
+                continue
+            try:
+                events = self.selector.select(timeout=0.5)
+            except OSError as e:
+                print(f"Select error: {e}")
+                continue
+            with self.lock:
+                for key, mask in events:
+                    client = key.fileobj
+                    if client not in self.clients:
+                        continue  # Removed while we were waiting
+                    try:
+                        if mask & selectors.EVENT_READ and not client.recv(4096):
+                            print("Client disconnected")
+                            self.remove_client(client)
+                            continue
+                        if mask & selectors.EVENT_WRITE:
+                            backlog = self.pending[client]
+                            del backlog[:client.send(backlog)]
+                            if not backlog:
+                                del self.pending[client]
+                                self.selector.modify(client, selectors.EVENT_READ)
+                    except BlockingIOError:
+                        pass
+                    except OSError:
+                        print("Client disconnected")
+                        self.remove_client(client)
+        with self.lock:
+            for client in self.clients[:]:
+                self.remove_client(client)
+            self.close_removed()
+        self.selector.close()
+
     def collect_data(self):
+        # Sample on a fixed cadence: sleep only what is left of each period
+        period = 0.05  # Adjust the sample period as needed
+        # Hot-loop names bound once: local lookups are cheaper than attribute/global ones
+        query = self.multimeter.query
+        emit = self.data_updated.emit
+        broadcast = self.broadcast
+        pack = self._pack
+        binary_mode = self.binary_mode
+        emit_batch = self.emit_batch
+        emit_interval = self.emit_interval
+        lock = self.lock
+        now = time.monotonic
+        sleep = time.sleep
+        next_t = now()
+        plot_pending = []
+        last_emit = next_t
         while self.running:
             try:
-                start_time = time.time()
+                start_time = now()
                 # Get the current measurement from the multimeter - channel 1 only
-                response = self.multimeter.query(":READ?")
+                response = query(":READ?")
                 data_str = response.strip()
                 
                 # Just get the first value (channel 1)
@@ -42,22 +163,26 @@ class DataCollector(QObject):
                 else:
                     channel1_value = float(data_str)
 
-                # Emit data to update client plot
-                self.data_updated.emit(channel1_value)
+                # Emit data to update client plot once a batch is full or the interval has passed
+                plot_pending.append(channel1_value)
+                if len(plot_pending) >= emit_batch or start_time - last_emit >= emit_interval:
+                    emit(np.array(plot_pending))
+                    plot_pending.clear()
+                    last_emit = start_time
 
-                # Send only channel 1 data to clients
-                with self.lock:
-                    for client in self.clients.copy():  # Iterate over a copy of the client list
-                        try:
-                            client.sendall(f"{channel1_value}\n".encode('utf-8'))
-                        except (BrokenPipeError, ConnectionResetError, ConnectionAbortedError):
-                            print("Client disconnected unexpectedly, removing from list.")
-                            self.clients.remove(client)
-
-                elapsed_time = time.time() - start_time
-                self.elapsed_times.append(elapsed_time)
+                # Send only channel 1 data to clients: encode once for all of them
+                if binary_mode:
+                    msg = pack(channel1_value)
+                else:
+                    msg = f"{channel1_value}\n".encode('ascii')
+                broadcast(msg)
 
-                time.sleep(0.05)  # Adjust the sleep time as needed
+                elapsed_time = now() - start_time
+                with lock:
+                    # self._times is swapped by the histogram thread, so it is looked up each time
+                    if self._n < self._times.size:
+                        self._times[self._n] = elapsed_time
+                        self._n += 1
 
             except pyvisa.errors.VisaIOError as e:
                 print(f"VISA IO Error: {e}")
@@ -66,14 +191,24 @@ class DataCollector(QObject):
             except Exception as e:
                 print(f"Unexpected error: {e}")
 
+            next_t += period
+            delay = next_t - now()
+            if delay > 0:
+                sleep(delay)
+            else:
+                next_t = now()  # Fell behind: restart the schedule from now
+
     def calculate_histogram(self):
         while self.running:
             time.sleep(10)  # Calculate histogram every 10 seconds
+            # Swap buffers under the lock; the histogram is computed outside it
             with self.lock:
-                if self.elapsed_times:
-                    hist, bin_edges = np.histogram(self.elapsed_times, bins=20)
-                    self.histogram_updated.emit([hist.tolist(), bin_edges.tolist()])
-                    self.elapsed_times.clear()
+                times, n = self._times, self._n
+                self._times, self._spare_times = self._spare_times, times
+                self._n = 0
+            if n:
+                hist, bin_edges = np.histogram(times[:n], bins=20)
+                self.histogram_updated.emit([hist.tolist(), bin_edges.tolist()])
 
     def stop(self):
         self.running = False
@@ -82,8 +217,11 @@ class DataPlotter(QWidget):
     def __init__(self):
         super().__init__()
         self.initUI()
-        self.data_x = []
         self.max_data_points = 500
+        # Ring buffer stored twice over so the latest samples are always one contiguous view
+        self.buf = np.zeros(2 * self.max_data_points, dtype=np.float32)
+        self.idx = 0
+        self.filled = 0
 
     def initUI(self):
         self.layout = QVBoxLayout(self)
@@ -96,14 +234,26 @@ class DataPlotter(QWidget):
         self.layout.addWidget(self.plotWidget)
 
     def update_plot(self, data):
-        self.data_x.append(data)
-        self.curve.setData(self.data_x[-self.max_data_points:])
+        n = self.max_data_points
+        data = data[-n:]
+        k = len(data)
+        # Copy into both halves, wrapping at most once
+        first = min(k, n - self.idx)
+        self.buf[self.idx:self.idx + first] = data[:first]
+        self.buf[self.idx + n:self.idx + n + first] = data[:first]
+        if k > first:
+            self.buf[:k - first] = data[first:]
+            self.buf[n:n + k - first] = data[first:]
+        self.idx = (self.idx + k) % n
+        self.filled = min(self.filled + k, n)
+        end = self.idx + n
+        self.curve.setData(self.buf[end - self.filled:end])
 
     def update_histogram(self, hist_data):
         hist, bin_edges = hist_data
         self.histogram.setOpts(x=bin_edges[:-1], height=hist, width=(bin_edges[1] - bin_edges[0]))
 
-def main():
+def main(binary_mode=False):
     app = QApplication([])
 
     # Connect to the Keithley multimeter
@@ -120,7 +270,7 @@ def main():
     data_plotter.show()
 
     # Set up data collector
-    data_collector = DataCollector(multimeter)
+    data_collector = DataCollector(multimeter, binary_mode=binary_mode)
     data_collector.data_updated.connect(data_plotter.update_plot)
     data_collector.histogram_updated.connect(data_plotter.update_histogram)
     collector_thread = threading.Thread(target=data_collector.start)
@@ -133,21 +283,15 @@ def main():
     server.bind((host, port))
     server.listen(5)
     print(f"Server listening on {host}:{port}")
+    print(f"Mode: {'Binary' if binary_mode else 'Text'}")
 
-    def accept_clients():
-        while True:
-            client_socket, addr = server.accept()
-            print(f"Accepted connection from {addr}")
-            print("Sending channel 1 data only to this client")
-            with data_collector.lock:
-                data_collector.clients.append(client_socket)
-            client_handler = threading.Thread(target=handle_client, args=(client_socket, data_collector))
-            client_handler.start()
-
-    server_thread = threading.Thread(target=accept_clients)
-    server_thread.start()
+    # Accept on the Qt thread: the notifier fires when a connection is pending
+    server.setblocking(False)
+    notifier = QSocketNotifier(server.fileno(), QSocketNotifier.Read)
+    notifier.activated.connect(lambda: accept_clients(server, data_collector))
 
     def on_close():
+        notifier.setEnabled(False)
         data_collector.stop()
         collector_thread.join()
         server.close()
@@ -158,17 +302,26 @@ def main():
 
     app.exec_()
 
-def handle_client(client_socket, data_collector):
-    try:
-        while True:
-            time.sleep(1)  # Adjust this delay as needed
-    except ConnectionResetError:
-        print("Client disconnected")
-    finally:
-        with data_collector.lock:
-            if client_socket in data_collector.clients:
-                data_collector.clients.remove(client_socket)
-        client_socket.close()
+def accept_clients(server, data_collector):
+    # Drain every pending connection; the listening socket is non-blocking
+    while True:
+        try:
+            client_socket, addr = server.accept()
+        except BlockingIOError:
+            return
+        print(f"Accepted connection from {addr}")
+        print("Sending channel 1 data only to this client")
+        # Push each small reading out immediately instead of waiting on Nagle
+        client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1 << 16)
+        data_collector.add_client(client_socket)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Stream Keithley channel 1 current readings over TCP')
+    parser.add_argument('--binary', action='store_true', help='Send binary floats instead of text')
+
+    args = parser.parse_args()
+
+    main(args.binary)
\ No newline at end of file
@@ -4,27 +4,63 @@ import random
 import threading
 import sys
 import struct  # For binary data packing
+from concurrent.futures import ThreadPoolExecutor
 
-def handle_client(client_socket, client_address, binary_mode=False):
+try:
+    import numpy as np  # Optional: draws random values in batches
+except ImportError:
+    np = None
+
+# Compiled once; struct.pack would look the format up on every call
+_FLOAT_STRUCT = struct.Struct('<f')
+_pack = _FLOAT_STRUCT.pack
+
+# Each client holds a worker for its whole connection, so this caps concurrent clients
+MAX_CLIENTS = 32
+
+# Random values drawn per NumPy call
+RANDOM_BATCH = 4096
+
+def random_values(batch_size=RANDOM_BATCH):
+    """Yield (value, packed) pairs of random floats between 0.1 and 0.9.
+    
+    value is the full-precision float sent in text mode; packed is the value as a
+    4-byte little-endian float for binary mode. With NumPy, values are drawn
+    batch_size at a time and packed with a single tobytes() call.
+    """
+    if np is None:
+        while True:
+            value = random.uniform(0.1, 0.9)
+            yield value, _pack(value)
+    rng = np.random.default_rng()
+    while True:
+        batch = rng.uniform(0.1, 0.9, batch_size)
+        raw = batch.astype('<f4').tobytes()
+        for i, value in enumerate(batch.tolist()):
+            yield value, raw[4 * i:4 * i + 4]
+
+def handle_client(client_socket, client_address, binary_mode=False, stop_event=None):
     """Handle an individual client connection by sending random float values.
     
     Args:
         client_socket: The socket connected to the client
         client_address: The address of the client
         binary_mode: If True, send binary-packed floats; if False, send text
+        stop_event: Optional threading.Event that ends the loop when set
     """
     print(f"Client connected: {client_address}")
+    values = random_values()
     try:
-        while True:
+        while stop_event is None or not stop_event.is_set():
             # Generate random float between 0.1 and 0.9
-            random_value = random.uniform(0.1, 0.9)
+            random_value, packed = next(values)
             
             if binary_mode:
-                # Pack as 4-byte binary float (C/C++ compatible)
-                message = struct.pack('f', random_value)
+                # 4-byte binary float (C/C++ compatible)
+                message = packed
             else:
                 # Send as text with newline delimiter
-                message = f"{random_value}\n".encode('utf-8')
+                message = f"{random_value}\n".encode('ascii')
             
             try:
                 # Send the random value to the client
@@ -49,7 +85,7 @@ def handle_client(client_socket, client_address, binary_mode=False):
             pass  # Socket might already be closed
 
 def start_server(host='0.0.0.0', port=8888, binary_mode=False):
-    """Start a TCP server that listens for connections and spawns client handlers.
+    """Start a TCP server that listens for connections and hands clients to a worker pool.
     
     Args:
         host: Host IP to bind to (default: all interfaces)
@@ -73,6 +109,10 @@ def start_server(host='0.0.0.0', port=8888, binary_mode=False):
         print(f"Mode: {'Binary' if binary_mode else 'Text'}")
         print("Waiting for clients to connect...")
         
+        # Bounded pool: clients beyond MAX_CLIENTS wait until a worker frees up
+        executor = ThreadPoolExecutor(max_workers=MAX_CLIENTS)
+        stop_event = threading.Event()
+        
         try:
             while True:
                 # Wait for a connection
@@ -82,19 +122,20 @@ def start_server(host='0.0.0.0', port=8888, binary_mode=False):
                     # Set a timeout on the socket
                     client_socket.settimeout(2.0)
                     
-                    # Start a new thread to handle the client
-                    client_thread = threading.Thread(
-                        target=handle_client,
-                        args=(client_socket, client_address, binary_mode)
-                    )
-                    client_thread.daemon = True
-                    client_thread.start()
+                    # Disable Nagle so each small value is sent immediately
+                    client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                    client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1 << 16)
+                    
+                    # Hand the client to the worker pool
+                    executor.submit(handle_client, client_socket, client_address, binary_mode, stop_event)
                 except Exception as e:
                     print(f"Error accepting connection: {str(e)}")
                     continue
         except KeyboardInterrupt:
             print("\nServer shutting down...")
         finally:
+            stop_event.set()
+            executor.shutdown(wait=True, cancel_futures=True)
             server_socket.close()
     except OSError as e:
         print(f"Could not start server: {str(e)}")
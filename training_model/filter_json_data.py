@@ -1,66 +1,139 @@
 import json
+import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
 import shutil # Import the shutil module for file operations
 from typing import Dict, List, Any
 
-def filter_and_group_json_data(data_folder: Path) -> List[Path]:
+try:
+    import orjson  # C parser, noticeably faster than the stdlib on large scan files
+    json_loads = orjson.loads  # orjson.JSONDecodeError subclasses json.JSONDecodeError
+except ImportError:
+    json_loads = json.loads
+
+# Define thresholds
+START_POWER_THRESHOLD = 100 * 1e-6  # 100 micro
+PEAK_VALUE_THRESHOLD = 3 * 1e-3    # 3 milli
+
+# File reads overlap well in threads; orjson also releases the GIL while parsing
+MAX_WORKERS = min(32, (os.cpu_count() or 1) * 2)
+
+def _check_file(file_path: Path, verbose: bool = False) -> str:
+    """
+    Checks one JSON file against the thresholds.
+    Returns 'match', 'power', 'no_peak', 'no_match' or 'error'.
+    """
+    try:
+        data = json_loads(file_path.read_bytes())
+
+        start_power = data['baseline']['value']
+        
+        # Cheap check first: no need to look for the peak if the start power already fails
+        if start_power >= START_POWER_THRESHOLD:
+            if verbose:
+                print(f"No match for {file_path.name}: Start Power {start_power:.8f}")
+            return 'power'
+        
+        peak_value = None
+        measurements = data.get('measurements', [])
+        for m in measurements:
+            if m.get('isPeak') == True:
+                peak_value = m.get('value')
+                break # Assuming only one peak per scan
+
+        if peak_value is None:
+            if verbose:
+                print(f"Skipping {file_path.name}: No peak found (isPeak: true missing).")
+            return 'no_peak'
+
+        # Apply filtering conditions (one print per file so threaded output does not interleave)
+        if peak_value > PEAK_VALUE_THRESHOLD:
+            if verbose:
+                print(f"Match found for {file_path.name}:\n"
+                      f"  Start Power: {start_power:.8f} (Threshold: < {START_POWER_THRESHOLD:.8f})\n"
+                      f"  Peak Value:  {peak_value:.8f} (Threshold: > {PEAK_VALUE_THRESHOLD:.8f})")
+            return 'match'
+        if verbose:
+            print(f"No match for {file_path.name}:\n"
+                  f"  Start Power: {start_power:.8f}\n"
+                  f"  Peak Value:  {peak_value:.8f}")
+        return 'no_match'
+
+    except json.JSONDecodeError as e:
+        print(f"Error decoding JSON from {file_path.name}: {e}")
+    except KeyError as e:
+        print(f"Missing expected key '{e}' in JSON from {file_path.name}.")
+    except Exception as e:
+        print(f"An unexpected error occurred processing {file_path.name}: {e}")
+    return 'error'
+
+# Independent file copies; a few in flight hide per-file open/close latency
+COPY_WORKERS = 8
+
+def _copy_file_data(source: Path, destination: Path) -> None:
+    """
+    Copies file contents, letting the kernel share extents (reflink on btrfs/XFS)
+    through os.copy_file_range where available; falls back to shutil.copyfile.
+    """
+    if hasattr(os, 'copy_file_range'):
+        try:
+            with open(source, 'rb') as src, open(destination, 'wb') as dst:
+                remaining = os.fstat(src.fileno()).st_size
+                while remaining > 0:
+                    copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+                    if copied == 0:
+                        break
+                    remaining -= copied
+            return
+        except OSError:
+            pass  # e.g. cross-device or unsupported filesystem
+    shutil.copyfile(source, destination)
+
+def copy_json_file(path: Path, destination_folder: Path) -> str:
+    """
+    Copies one file into destination_folder keeping its timestamps.
+    Returns the line to report for it.
+    """
+    destination_path = destination_folder / path.name
+    try:
+        # Only timestamps are carried over; copy2's full copystat is not needed
+        st = path.stat()
+        _copy_file_data(path, destination_path)
+        os.utime(destination_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+        return f"- Copied: {path.name} to {destination_path}"
+    except Exception as e:
+        return f"  Error copying {path.name}: {e}"
+
+def filter_and_group_json_data(data_folder: Path, verbose: bool = False) -> List[Path]:
     """
     Filters JSON files based on start power and peak value criteria,
     and returns a list of paths to matching files.
+    Files are checked concurrently; per-file details are printed only when verbose is True.
     """
-    matching_files = []
-    
-    # Define thresholds
-    START_POWER_THRESHOLD = 100 * 1e-6  # 100 micro
-    PEAK_VALUE_THRESHOLD = 3 * 1e-3    # 3 milli
-
     print(f"Scanning for JSON files in: {data_folder}")
 
     if not data_folder.exists():
         print(f"Error: Data folder '{data_folder}' does not exist.")
         return []
     
-    json_files = sorted(list(data_folder.glob('*.json')))
+    json_files = sorted(data_folder.glob('*.json'))
     if not json_files:
         print(f"No JSON files found in '{data_folder}'.")
         return []
 
-    for file_path in json_files:
-        try:
-            with open(file_path, 'r') as f:
-                data = json.load(f)
-
-            start_power = data['baseline']['value']
-            
-            peak_value = None
-            measurements = data.get('measurements', [])
-            for m in measurements:
-                if m.get('isPeak') == True:
-                    peak_value = m.get('value')
-                    break # Assuming only one peak per scan
-
-            if peak_value is None:
-                print(f"Skipping {file_path.name}: No peak found (isPeak: true missing).")
-                continue
-
-            # Apply filtering conditions
-            if start_power < START_POWER_THRESHOLD and peak_value > PEAK_VALUE_THRESHOLD:
-                print(f"Match found for {file_path.name}:")
-                print(f"  Start Power: {start_power:.8f} (Threshold: < {START_POWER_THRESHOLD:.8f})")
-                print(f"  Peak Value:  {peak_value:.8f} (Threshold: > {PEAK_VALUE_THRESHOLD:.8f})")
-                matching_files.append(file_path)
-            else:
-                print(f"No match for {file_path.name}:")
-                print(f"  Start Power: {start_power:.8f}")
-                print(f"  Peak Value:  {peak_value:.8f}")
-
-
-        except json.JSONDecodeError as e:
-            print(f"Error decoding JSON from {file_path.name}: {e}")
-        except KeyError as e:
-            print(f"Missing expected key '{e}' in JSON from {file_path.name}.")
-        except Exception as e:
-            print(f"An unexpected error occurred processing {file_path.name}: {e}")
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        results = list(executor.map(partial(_check_file, verbose=verbose), json_files))
+
+    # map() keeps input order, so the matches stay sorted
+    matching_files = [path for path, result in zip(json_files, results) if result == 'match']
+    counts = Counter(results)
+
+    print(f"Checked {len(json_files)} files: {len(matching_files)} matched, "
+          f"{counts['power']} start power >= {START_POWER_THRESHOLD:.8f}, "
+          f"{counts['no_peak']} without peak, {counts['no_match']} peak <= {PEAK_VALUE_THRESHOLD:.8f}, "
+          f"{counts['error']} errors")
 
     return matching_files
 
@@ -91,12 +164,9 @@ if __name__ == "__main__":
             exit()
 
         print("\nCopying matching files to /maindata subfolder:")
-        for path in filtered_json_paths:
-            destination_path = MAIN_DATA_SUBFOLDER / path.name
-            try:
-                shutil.copy2(path, destination_path) # copy2 preserves metadata
-                print(f"- Copied: {path.name} to {destination_path}")
-            except Exception as e:
-                print(f"  Error copying {path.name}: {e}")
+        with ThreadPoolExecutor(max_workers=COPY_WORKERS) as executor:
+            for message in executor.map(partial(copy_json_file, destination_folder=MAIN_DATA_SUBFOLDER),
+                                        filtered_json_paths):
+                print(message)
     else:
         print("No JSON files matched the specified criteria. No files copied.")
\ No newline at end of file
@@ -1,18 +1,25 @@
 import json
+from operator import itemgetter
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, List, Any, Optional, Tuple
+
+import numpy as np
+
+try:
+    import orjson  # C parser, noticeably faster than the stdlib on large scan files
+    json_loads = orjson.loads  # orjson.JSONDecodeError subclasses json.JSONDecodeError
+except ImportError:
+    json_loads = json.loads
 
 # Make sure this file (predict_scanner_peak.py) is in the same directory as training_script.py
 from training_script import ScannerPeakPredictor
 
-def load_and_predict_from_json(json_file_path: Path, predictor: ScannerPeakPredictor) -> Optional[Dict]:
-    """
-    Loads data from a JSON file, makes a prediction, and compares it to the actual peak.
-    Returns a dictionary of metrics for summarization or None if processing fails.
-    """
-    print(f"\n--- Processing: {json_file_path.name} ---")
-    metrics = {
-        'filename': json_file_path.name,
+# Fast path for measurements that carry every field used for prediction
+_measurement_fields = itemgetter('value', 'gradient', 'relativeImprovement', 'axis', 'direction')
+
+def _empty_metrics(filename: str) -> Dict:
+    return {
+        'filename': filename,
         'success': False,
         'predicted_position': None,
         'predicted_value': None,
@@ -26,9 +33,19 @@ def load_and_predict_from_json(json_file_path: Path, predictor: ScannerPeakPredi
         'estimated_measurements_to_peak': None
     }
 
+def load_prediction_input(json_file_path: Path,
+                          encode_move: Callable[[str, str], float]) -> Tuple[Dict, Optional[Dict]]:
+    """
+    Loads the prediction inputs from a JSON file in a single pass over the measurements.
+    The first 10 measurements are stored as a (4, 10) array of value, gradient,
+    relativeImprovement and encoded move (padded with the last measurement), and the
+    actual peak is picked up on the way.
+    Returns (metrics, inputs); inputs is None if the file cannot be used for a prediction.
+    """
+    metrics = _empty_metrics(json_file_path.name)
+
     try:
-        with open(json_file_path, 'r') as f:
-            data = json.load(f)
+        data = json_loads(json_file_path.read_bytes())
 
         start_pos = data['baseline']['position']
         start_val = data['baseline']['value']
@@ -36,54 +53,81 @@ def load_and_predict_from_json(json_file_path: Path, predictor: ScannerPeakPredi
         measurements_raw = data.get('measurements', [])
         if not isinstance(measurements_raw, list):
             print(f"Warning: 'measurements' is not a list in {json_file_path.name}. Skipping.")
-            return metrics
+            return metrics, None
 
-        first_10_measurements_for_prediction = []
-        for i, m in enumerate(measurements_raw):
-            if i >= 10:
+        first_10 = np.empty((4, 10))
+        count = 0
+        actual_peak_pos = None
+        actual_peak_value = None
+        peak_found = False
+        for m in measurements_raw:
+            if count < 10:
+                try:
+                    value, gradient, improvement, axis, direction = _measurement_fields(m)
+                except KeyError:
+                    value = m.get('value', start_val)
+                    gradient = m.get('gradient', 0.0)
+                    improvement = m.get('relativeImprovement', 0.0)
+                    axis = m.get('axis', 'Z')
+                    direction = m.get('direction', 'Positive')
+                first_10[0, count] = value
+                first_10[1, count] = gradient
+                first_10[2, count] = improvement
+                first_10[3, count] = encode_move(axis, direction)
+                count += 1
+            if not peak_found and m.get('isPeak') == True:
+                actual_peak_pos = m.get('position')
+                actual_peak_value = m.get('value')
+                peak_found = True
+            if peak_found and count >= 10:
                 break
-            prepared_m = {
-                'value': m.get('value', start_val),
-                'gradient': m.get('gradient', 0.0),
-                'relativeImprovement': m.get('relativeImprovement', 0.0),
-                'axis': m.get('axis', 'Z'),
-                'direction': m.get('direction', 'Positive')
-            }
-            first_10_measurements_for_prediction.append(prepared_m)
-
-        if not first_10_measurements_for_prediction:
+
+        if count == 0:
             print(f"No valid measurements found or extracted from {json_file_path.name} to make a prediction.")
-            return metrics
-
-        try:
-            prediction = predictor.predict(
-                start_position=start_pos,
-                start_value=start_val,
-                first_10_measurements=first_10_measurements_for_prediction
-            )
-            metrics['predicted_position'] = prediction['predicted_position']
-            metrics['predicted_value'] = prediction['predicted_value']
-            metrics['improvement_factor'] = prediction['improvement_factor']
-            metrics['estimated_measurements_to_peak'] = prediction['estimated_measurements_to_peak']
-            metrics['success'] = True
-
-        except Exception as e:
-            print(f"Error during prediction for {json_file_path.name}: {e}")
-            return metrics
+            return metrics, None
+
+        # Pad short scans with the last measurement, as in training
+        first_10[:, count:] = first_10[:, count - 1:count]
+
+        return metrics, {
+            'start_position': start_pos,
+            'start_value': start_val,
+            'first_10': first_10,
+            'actual_position': actual_peak_pos,
+            'actual_value': actual_peak_value
+        }
+
+    except json.JSONDecodeError as e:
+        print(f"Error decoding JSON from {json_file_path.name}: {e}")
+    except KeyError as e:
+        print(f"Missing expected key in JSON from {json_file_path.name}: {e}. Please check JSON structure.")
+    except Exception as e:
+        print(f"An unexpected error occurred processing {json_file_path.name}: {e}")
+        import traceback
+        traceback.print_exc()
+
+    return metrics, None
+
+def compare_prediction(metrics: Dict, inputs: Dict, prediction: Dict) -> Dict:
+    """
+    Records a prediction in the metrics and compares it to the actual peak in the scan.
+    """
+    print(f"\n--- Processing: {metrics['filename']} ---")
+    metrics['predicted_position'] = prediction['predicted_position']
+    metrics['predicted_value'] = prediction['predicted_value']
+    metrics['improvement_factor'] = prediction['improvement_factor']
+    metrics['estimated_measurements_to_peak'] = prediction['estimated_measurements_to_peak']
+    metrics['success'] = True
 
+    try:
         print("\n--- Prediction Results ---")
         print(f"Predicted peak position: {prediction['predicted_position']}")
         print(f"Predicted peak value: {prediction['predicted_value']:.8f}")
         print(f"Improvement factor: {prediction['improvement_factor']:.4f}")
         print(f"Estimated measurements to peak: {prediction['estimated_measurements_to_peak']}")
 
-        actual_peak_pos = None
-        actual_peak_value = None
-        for m in measurements_raw:
-            if m.get('isPeak') == True:
-                actual_peak_pos = m.get('position')
-                actual_peak_value = m.get('value')
-                break
+        actual_peak_pos = inputs['actual_position']
+        actual_peak_value = inputs['actual_value']
 
         if actual_peak_pos and actual_peak_value is not None:
             metrics['actual_position'] = actual_peak_pos
@@ -107,17 +151,57 @@ def load_and_predict_from_json(json_file_path: Path, predictor: ScannerPeakPredi
         else:
             print("No 'isPeak': true found in measurements for comparison.")
 
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON from {json_file_path.name}: {e}")
-    except KeyError as e:
-        print(f"Missing expected key in JSON from {json_file_path.name}: {e}. Please check JSON structure.")
     except Exception as e:
-        print(f"An unexpected error occurred processing {json_file_path.name}: {e}")
+        print(f"An unexpected error occurred processing {metrics['filename']}: {e}")
         import traceback
         traceback.print_exc()
 
     return metrics
 
+def load_and_predict_from_json(json_file_path: Path, predictor: ScannerPeakPredictor) -> Optional[Dict]:
+    """
+    Loads data from a JSON file, makes a prediction, and compares it to the actual peak.
+    Returns a dictionary of metrics for summarization or None if processing fails.
+    """
+    metrics, inputs = load_prediction_input(json_file_path, predictor.encode_axis_direction)
+    if inputs is None:
+        return metrics
+
+    try:
+        prediction = predictor.predict_batch(
+            [inputs['start_position']], [inputs['start_value']], inputs['first_10'][np.newaxis]
+        )[0]
+    except Exception as e:
+        print(f"Error during prediction for {json_file_path.name}: {e}")
+        return metrics
+
+    return compare_prediction(metrics, inputs, prediction)
+
+def predict_all_from_json(json_files: List[Path], predictor: ScannerPeakPredictor) -> List[Dict]:
+    """
+    Loads every JSON file first, predicts all usable scans with one batched model call,
+    then compares each prediction to its actual peak. Returns metrics in file order.
+    """
+    loaded = [load_prediction_input(json_file, predictor.encode_axis_direction) for json_file in json_files]
+    ready = [(metrics, inputs) for metrics, inputs in loaded if inputs is not None]
+    if not ready:
+        return [metrics for metrics, _ in loaded]
+
+    try:
+        predictions = predictor.predict_batch(
+            [inputs['start_position'] for _, inputs in ready],
+            [inputs['start_value'] for _, inputs in ready],
+            np.stack([inputs['first_10'] for _, inputs in ready])
+        )
+    except Exception as e:
+        print(f"Error during batched prediction: {e}")
+        return [metrics for metrics, _ in loaded]
+
+    for (metrics, inputs), prediction in zip(ready, predictions):
+        compare_prediction(metrics, inputs, prediction)
+
+    return [metrics for metrics, _ in loaded]
+
 
 if __name__ == "__main__":
     MODEL_PATH = Path('models/scanner_peak_predictor')
@@ -154,11 +238,7 @@ if __name__ == "__main__":
         print("Please ensure the model files are present at the specified path and are correctly saved by the training script.")
         exit()
 
-    all_results = []
-    for json_file in JSON_FILES:
-        result = load_and_predict_from_json(json_file, predictor)
-        if result:
-            all_results.append(result)
+    all_results = predict_all_from_json(JSON_FILES, predictor)
 
     # --- Summarize Results ---
     print(f"\n{'='*60}")
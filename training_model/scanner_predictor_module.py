@@ -1,19 +1,223 @@
 # scanner_predictor_module.py
 
 import numpy as np
-import pandas as pd
-import json # You might not need json here if only training script uses it for file loading
 from pathlib import Path
-# import matplotlib.pyplot as plt # Probably not needed for just prediction
-# import seaborn as sns # Probably not needed for just prediction
-from sklearn.preprocessing import StandardScaler
-from tensorflow import keras
-from tensorflow.keras import layers
-import joblib
+try:
+    from numba import njit  # Compiles the feature-row kernel to native code when installed
+except ImportError:
+    njit = None
 # --- CHANGE IS HERE ---
 from typing import Dict, List, Tuple, Optional, Any
 # --- END CHANGE ---
 
+# Model files are named <stem><suffix>; the fused stem takes over once fuse_scalers() has run
+MODEL_STEM = 'model'
+FUSED_MODEL_STEM = 'model_fused' # scalers folded into the first/last Dense layers
+TFLITE_SUFFIX = '.tflite'
+# Dynamic-range quantized: int8 weights, float activations (~4x smaller, faster on x86 than full int8)
+TFLITE_DYNRANGE_SUFFIX = '_dynrange.tflite'
+# FP16 weights: half the size of FP32 and runnable on the GPU delegate (dynamic-range is not)
+TFLITE_FP16_SUFFIX = '_fp16.tflite'
+# SavedModel directory: its serving signature runs as a plain TF graph without Keras wrappers
+SAVED_MODEL_SUFFIX = '_saved_model'
+# ONNX graph for ONNX Runtime, whose CPU provider fuses Gemm + activation for this small MLP
+ONNX_SUFFIX = '.onnx'
+ONNX_OPSET = 15
+GPU_DELEGATE_LIBRARY = 'libtensorflowlite_gpu_delegate.so'
+# Scaler vectors and column lists as plain arrays, read without pickle (see export_artifacts)
+ARTIFACTS_FILE = 'artifacts.npz'
+
+def _model_stem(model_path: Path) -> str:
+    return FUSED_MODEL_STEM if (model_path / f"{FUSED_MODEL_STEM}.h5").exists() else MODEL_STEM
+
+def _scaler_affine(scaler) -> Tuple[np.ndarray, np.ndarray]:
+    """Returns (mean, scale) of a fitted StandardScaler; disabled centering/scaling gives 0/1."""
+    mean = scaler.mean_ if getattr(scaler, 'mean_', None) is not None else 0.0
+    scale = scaler.scale_ if getattr(scaler, 'scale_', None) is not None else 1.0
+    return np.asarray(mean, dtype=np.float64), np.asarray(scale, dtype=np.float64)
+
+# TensorFlow is imported on first use: it takes seconds and hundreds of MB to load.
+# The TFLite paths use the standalone tflite_runtime package when it is installed.
+def _tflite_interpreter():
+    """Returns the TFLite Interpreter class."""
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+def _load_gpu_delegate():
+    """Returns the TFLite GPU delegate, or None when it is not installed."""
+    try:
+        try:
+            from tflite_runtime.interpreter import load_delegate
+        except ImportError:
+            import tensorflow as tf
+            load_delegate = tf.lite.experimental.load_delegate
+        return load_delegate(GPU_DELEGATE_LIBRARY)
+    except (ImportError, ValueError, OSError, AttributeError):
+        return None
+
+def fuse_scalers(model_path: str) -> Path:
+    """
+    Offline step: folds scaler_X into the first Dense layer and scaler_y into the last one,
+    writing model_fused.h5. With
+        X_scaled = (X - mean_X) / scale_X   and   y = y_scaled * scale_y + mean_y
+    the folded weights are
+        W1' = W1 / scale_X[:, None],  b1' = b1 - (mean_X / scale_X) @ W1
+        Wn' = Wn * scale_y,           bn' = bn * scale_y + mean_y
+    so the fused model maps raw features straight to unscaled targets.
+    The last Dense layer must be linear for the output fold to be exact.
+    """
+    from tensorflow import keras
+    from tensorflow.keras import layers
+    import joblib
+
+    model_path = Path(model_path)
+    model = keras.models.load_model(model_path / f"{MODEL_STEM}.h5")
+    scaler_X = joblib.load(model_path / 'scaler_X.pkl')
+    scaler_y = joblib.load(model_path / 'scaler_y.pkl')
+
+    weighted = [layer for layer in model.layers if layer.get_weights()]
+    first, last = weighted[0], weighted[-1]
+    if not isinstance(first, layers.Dense) or not isinstance(last, layers.Dense):
+        raise ValueError("Scaler fusion needs Dense first and last layers")
+    if last.get_config().get('activation') != 'linear':
+        raise ValueError("Scaler fusion needs a linear output layer")
+
+    kernel, bias = first.get_weights()
+    x_mean, x_scale = (np.broadcast_to(v, kernel.shape[:1]) for v in _scaler_affine(scaler_X))
+    first.set_weights([kernel / x_scale[:, None], bias - (x_mean / x_scale) @ kernel])
+
+    kernel, bias = last.get_weights() # Re-read: first and last may be the same layer
+    y_mean, y_scale = (np.broadcast_to(v, kernel.shape[1:]) for v in _scaler_affine(scaler_y))
+    last.set_weights([kernel * y_scale[None, :], bias * y_scale + y_mean])
+
+    output_path = model_path / f"{FUSED_MODEL_STEM}.h5"
+    model.save(output_path)
+    print(f"Fused model written to {output_path}")
+    return output_path
+
+def export_artifacts(model_path: str) -> Path:
+    """
+    Offline step: collects the scaler mean/scale vectors and the feature/target column lists
+    from the .pkl files into model_path/artifacts.npz. load_model() reads it instead of the
+    pickles when present, so the inference path needs neither joblib nor sklearn.
+    """
+    import joblib
+
+    model_path = Path(model_path)
+    x_mean, x_scale = _scaler_affine(joblib.load(model_path / 'scaler_X.pkl'))
+    y_mean, y_scale = _scaler_affine(joblib.load(model_path / 'scaler_y.pkl'))
+    feature_columns = joblib.load(model_path / 'feature_columns.pkl')
+    target_columns = joblib.load(model_path / 'target_columns.pkl')
+    output_path = model_path / ARTIFACTS_FILE
+    np.savez(output_path, x_mean=x_mean, x_scale=x_scale, y_mean=y_mean, y_scale=y_scale,
+             feature_columns=np.asarray(list(feature_columns), dtype=str),
+             target_columns=np.asarray(list(target_columns), dtype=str))
+    print(f"Artifacts written to {output_path}")
+    return output_path
+
+def export_saved_model(model_path: str) -> Path:
+    """
+    Offline step: exports model_path/<stem>.h5 as a SavedModel directory <stem>_saved_model.
+    load_model() uses it instead of the .h5 file when no TFLite model is present.
+    """
+    import tensorflow as tf
+    from tensorflow import keras
+
+    model_path = Path(model_path)
+    stem = _model_stem(model_path)
+    model = keras.models.load_model(model_path / f"{stem}.h5")
+    output_path = model_path / f"{stem}{SAVED_MODEL_SUFFIX}"
+    if hasattr(model, 'export'):
+        model.export(str(output_path)) # Writes a serving_default signature
+    else:
+        tf.saved_model.save(model, str(output_path))
+    print(f"SavedModel written to {output_path}")
+    return output_path
+
+def export_onnx(model_path: str) -> Path:
+    """
+    Offline step: converts model_path/<stem>.h5 into <stem>.onnx with an open batch dimension.
+    load_model() runs it on ONNX Runtime when no TFLite model is present.
+    """
+    import tensorflow as tf
+    from tensorflow import keras
+    import tf2onnx
+
+    model_path = Path(model_path)
+    stem = _model_stem(model_path)
+    model = keras.models.load_model(model_path / f"{stem}.h5")
+    output_path = model_path / f"{stem}{ONNX_SUFFIX}"
+    input_signature = [tf.TensorSpec([None, model.input_shape[-1]], tf.float32, name='input')]
+    tf2onnx.convert.from_keras(model, input_signature=input_signature, opset=ONNX_OPSET,
+                               output_path=str(output_path))
+    print(f"ONNX model written to {output_path}")
+    return output_path
+
+def convert_to_tflite(model_path: str, quantization: Optional[str] = None) -> Path:
+    """
+    Offline step: converts model_path/model.h5 (or model_fused.h5 when present) into a
+    TFLite FlatBuffer next to it. quantization=None writes <stem>.tflite; 'dynamic' writes
+    model_dynrange.tflite; 'float16' writes model_fp16.tflite for GPU-delegated inference.
+    Quantized files are always built from the unfused model.h5, with the scalers applied on
+    the host: folding 1/scale_X into the first layer leaves weight rows up to ~1e8 times larger
+    for the small-spread power/gradient features, which overflow float16 and, in a shared int8
+    range, round the position rows to zero.
+    load_model() picks the .tflite files up automatically when they exist.
+    """
+    import tensorflow as tf
+    from tensorflow import keras
+
+    model_path = Path(model_path)
+    stem = _model_stem(model_path) if quantization is None else MODEL_STEM
+    model = keras.models.load_model(model_path / f"{stem}.h5")
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantization == 'dynamic':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        output_path = model_path / f"{stem}{TFLITE_DYNRANGE_SUFFIX}"
+    elif quantization == 'float16':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+        output_path = model_path / f"{stem}{TFLITE_FP16_SUFFIX}"
+    elif quantization is None:
+        output_path = model_path / f"{stem}{TFLITE_SUFFIX}"
+    else:
+        raise ValueError(f"Unknown quantization '{quantization}'")
+    output_path.write_bytes(converter.convert())
+    print(f"TFLite model written to {output_path}")
+    return output_path
+
+# Input layout: 6 start coordinates + start value, then 8 features per measurement
+AXIS_ORDER = ['u', 'v', 'w', 'x', 'y', 'z']
+NUM_MEASUREMENTS = 10
+FEATURES_PER_MEASUREMENT = 8 # value, gradient, relativeImprovement, 3 axis OHE, 2 direction OHE
+N_INPUT_FEATURES = len(AXIS_ORDER) + 1 + NUM_MEASUREMENTS * FEATURES_PER_MEASUREMENT
+# Categorical measurement fields as one-hot slot indices; -1 (unknown) leaves the slots at zero
+AXIS_CODES = {'X': 0, 'Y': 1, 'Z': 2}
+DIRECTION_CODES = {'Positive': 0, 'Negative': 1}
+
+def _build_row(start, start_val, axis_codes, dir_codes, values, grads, impr, out):
+    """Writes one feature row into the zeroed out array; compiled with numba.njit when available."""
+    n_axes = start.shape[0]
+    for j in range(n_axes):
+        out[j] = start[j]
+    out[n_axes] = start_val
+    offset = n_axes + 1
+    for i in range(values.shape[0]):
+        out[offset] = values[i]
+        out[offset + 1] = grads[i]
+        out[offset + 2] = impr[i]
+        if axis_codes[i] >= 0:
+            out[offset + 3 + axis_codes[i]] = 1.0
+        if dir_codes[i] >= 0:
+            out[offset + 6 + dir_codes[i]] = 1.0
+        offset += 8 # FEATURES_PER_MEASUREMENT
+
+_build_row_jit = njit(cache=True)(_build_row) if njit is not None else None
+
 class ScannerPeakPredictor:
     def __init__(self):
         self.model = None
@@ -21,106 +225,323 @@ class ScannerPeakPredictor:
         self.scaler_y = None
         self.feature_columns = None # Store the order of features used during training
         self.target_columns = None # Store the order of targets used during training
+        self._infer = None # Traced inference function, built once in load_model
+        self._saved_model = None
+        self._sess = None # ONNX Runtime session, used when a .onnx file exists
+        self._sess_input = None
+        self._interp = None # TFLite interpreter, used instead of Keras when a .tflite file exists
+        self._input_index = None
+        self._output_index = None
+        self._interp_batch = 1 # Batch size the interpreter tensors are currently allocated for
+        # StandardScaler transforms cached as plain multiply-add vectors (see _cache_scalers)
+        self._x_inv_scale = None
+        self._x_shift = None
+        self._y_scale = None
+        self._y_mean = None
+        # Output index -> key, resolved once from target_columns (see _cache_targets).
+        # The defaults are the fixed u, v, w, x, y, z, value order used when no target_columns are saved
+        self._pos_slots = list(enumerate(AXIS_ORDER))
+        self._val_slot = len(AXIS_ORDER)
+        # Reused input row: predict() writes features in place instead of building a list
+        self._X_buf = np.zeros((1, N_INPUT_FEATURES), dtype=np.float32)
 
     def load_model(self, model_path: str):
         """Loads the trained model and scalers from the specified path."""
         try:
-            self.model = keras.models.load_model(Path(model_path) / 'model.h5')
-            self.scaler_X = joblib.load(Path(model_path) / 'scaler_X.pkl')
-            self.scaler_y = joblib.load(Path(model_path) / 'scaler_y.pkl')
-            self.feature_columns = joblib.load(Path(model_path) / 'feature_columns.pkl')
-            self.target_columns = joblib.load(Path(model_path) / 'target_columns.pkl')
+            stem = _model_stem(Path(model_path))
+            # FP16 on the GPU delegate if both are present; otherwise prefer the
+            # quantized FlatBuffer, then the float one, then ONNX, then the Keras model.
+            # Quantized files are never fused (see convert_to_tflite), so they use the host scalers
+            fp16_path = Path(model_path) / f"{MODEL_STEM}{TFLITE_FP16_SUFFIX}"
+            delegate = _load_gpu_delegate() if fp16_path.exists() else None
+            if delegate is not None:
+                self._load_tflite(fp16_path, delegates=[delegate])
+                stem = MODEL_STEM
+            else:
+                for tflite_stem, suffix in ((MODEL_STEM, TFLITE_DYNRANGE_SUFFIX), (stem, TFLITE_SUFFIX)):
+                    tflite_path = Path(model_path) / f"{tflite_stem}{suffix}"
+                    if tflite_path.exists():
+                        self._load_tflite(tflite_path)
+                        stem = tflite_stem
+                        break
+                else:
+                    onnx_path = Path(model_path) / f"{stem}{ONNX_SUFFIX}"
+                    saved_model_path = Path(model_path) / f"{stem}{SAVED_MODEL_SUFFIX}"
+                    if onnx_path.exists():
+                        self._load_onnx(onnx_path)
+                    elif saved_model_path.exists():
+                        self._load_saved_model(saved_model_path)
+                    else:
+                        self._load_keras(Path(model_path) / f"{stem}.h5")
+            artifacts_path = Path(model_path) / ARTIFACTS_FILE
+            if artifacts_path.exists():
+                # Plain arrays only: scaler_X/scaler_y stay None, predict() uses the cached vectors
+                with np.load(artifacts_path, allow_pickle=False) as artifacts:
+                    affines = tuple(artifacts[k] for k in ('x_mean', 'x_scale', 'y_mean', 'y_scale'))
+                    self._cache_scalers(fused=(stem == FUSED_MODEL_STEM), affines=affines)
+                    self.feature_columns = artifacts['feature_columns'].tolist()
+                    self.target_columns = artifacts['target_columns'].tolist()
+            else:
+                import joblib
+                self.scaler_X = joblib.load(Path(model_path) / 'scaler_X.pkl')
+                self.scaler_y = joblib.load(Path(model_path) / 'scaler_y.pkl')
+                self._cache_scalers(fused=(stem == FUSED_MODEL_STEM))
+                self.feature_columns = joblib.load(Path(model_path) / 'feature_columns.pkl')
+                self.target_columns = joblib.load(Path(model_path) / 'target_columns.pkl')
+            self._cache_targets()
+            self._warm_up()
             print(f"Model and scalers loaded successfully from {model_path}")
         except Exception as e:
             raise IOError(f"Error loading model components from {model_path}: {e}")
 
-    def predict(self, start_pos: Dict[str, float], start_val: float, measurements: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def _cache_scalers(self, fused: bool = False,
+                       affines: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = None):
         """
-        Makes a prediction for the peak position and value.
+        Caches the scalers as affine vectors so predict() skips sklearn's per-call validation:
+        X_scaled = X * (1/scale) - mean/scale and y = y_scaled * scale + mean.
+        affines is (x_mean, x_scale, y_mean, y_scale); by default it is read from scaler_X/scaler_y.
+        A fused model already contains both transforms, so nothing is cached and predict() skips them.
+        The vectors are float32 like the model, so neither step promotes the data to float64.
+        """
+        if fused:
+            self._x_inv_scale = self._x_shift = self._y_scale = self._y_mean = None
+            return
+        if affines is None:
+            affines = _scaler_affine(self.scaler_X) + _scaler_affine(self.scaler_y)
+        x_mean, x_scale, y_mean, y_scale = (np.asarray(v, dtype=np.float64) for v in affines)
+        self._x_inv_scale = (1.0 / x_scale).astype(np.float32)
+        self._x_shift = (-x_mean / x_scale).astype(np.float32)
+        self._y_mean = y_mean.astype(np.float32)
+        self._y_scale = y_scale.astype(np.float32)
+
+    def _warm_up(self):
+        """
+        Runs one dummy prediction so tracing, kernel selection and the numba row kernel's
+        compile (or cache load) happen at load, not on the first predict().
         """
+        self.predict({}, 0.0, [{'axis': 'X', 'direction': 'Positive'}])
+
+    def _cache_targets(self):
+        """Resolves which model outputs are position coordinates and which one is the peak value."""
+        if not self.target_columns:
+            return # Keep the fixed-order defaults
+        axes = set(AXIS_ORDER)
+        self._pos_slots = [(i, col) for i, col in enumerate(self.target_columns) if col in axes]
+        self._val_slot = next((i for i, col in enumerate(self.target_columns) if col == 'value'), None)
+
+    def _load_tflite(self, tflite_path: Path, delegates: Optional[List[Any]] = None):
+        """Loads a TFLite FlatBuffer; single-threaded XNNPACK kernels suit batch-size-1 calls."""
+        self._interp = _tflite_interpreter()(model_path=str(tflite_path), num_threads=1,
+                                             experimental_delegates=delegates)
+        self._interp.allocate_tensors()
+        self._input_index = self._interp.get_input_details()[0]['index']
+        self._output_index = self._interp.get_output_details()[0]['index']
+        self._interp_batch = self._interp.get_input_details()[0]['shape'][0]
+
+    def _load_onnx(self, onnx_path: Path):
+        """Opens an ONNX Runtime CPU session with all graph optimizations; one thread suits small batches."""
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = 1
+        self._sess = ort.InferenceSession(str(onnx_path), options, providers=['CPUExecutionProvider'])
+        self._sess_input = self._sess.get_inputs()[0].name
+
+    def _load_saved_model(self, saved_model_path: Path):
+        import tensorflow as tf
+
+        saved_model = tf.saved_model.load(str(saved_model_path))
+        signature = saved_model.signatures['serving_default']
+        # Signatures take keyword inputs and return a dict; resolve both names once
+        input_name = next(iter(signature.structured_input_signature[1]))
+        output_name = next(iter(signature.structured_outputs))
+        self._saved_model = saved_model # Keep the trackable alive while the signature is in use
+        self._infer = lambda x: signature(**{input_name: tf.constant(x)})[output_name]
+
+    def _load_keras(self, h5_path: Path):
+        import tensorflow as tf
+        from tensorflow import keras
+
+        self.model = keras.models.load_model(h5_path)
+        # Trace the forward pass once; model.predict() rebuilds its batching/callback machinery every call.
+        # The batch dimension is left open so predict() and predict_many() share the trace.
+        n_features = self.model.input_shape[-1]
+        model = self.model
+        concrete = tf.function(
+            lambda x: model(x, training=False),
+            input_signature=[tf.TensorSpec([None, n_features], tf.float32)]
+        ).get_concrete_function()
+        self._infer = lambda x: concrete(tf.constant(x))
+
+    def _run_model(self, X_scaled: np.ndarray) -> np.ndarray:
+        """Runs one forward pass on an (N, n_features) scaled input."""
+        X_scaled = np.asarray(X_scaled, dtype=np.float32)
+        if self._interp is not None:
+            if X_scaled.shape[0] != self._interp_batch:
+                # Re-plan the interpreter only when the batch size changes
+                self._interp.resize_tensor_input(self._input_index, X_scaled.shape)
+                self._interp.allocate_tensors()
+                self._interp_batch = X_scaled.shape[0]
+            self._interp.set_tensor(self._input_index, X_scaled)
+            self._interp.invoke()
+            return self._interp.get_tensor(self._output_index)
+        if self._sess is not None:
+            return self._sess.run(None, {self._sess_input: X_scaled})[0]
+        return self._infer(X_scaled).numpy()
+
+    def _fill_row(self, row: np.ndarray, start_pos: Dict[str, float], start_val: float,
+                  measurements: List[Dict[str, Any]]):
+        """Writes one input feature row in place; row must already be zeroed."""
+        # Transpose the measurement dicts (first 10) into per-field columns once
+        ms = measurements[:NUM_MEASUREMENTS]
+        self._fill_row_soa(
+            row, start_pos, start_val,
+            np.array([m.get('value', 0.0) for m in ms], dtype=np.float32),
+            np.array([m.get('gradient', 0.0) for m in ms], dtype=np.float32),
+            np.array([m.get('relativeImprovement', 0.0) for m in ms], dtype=np.float32),
+            np.array([AXIS_CODES.get(m.get('axis'), -1) for m in ms], dtype=np.int8),
+            np.array([DIRECTION_CODES.get(m.get('direction'), -1) for m in ms], dtype=np.int8))
+
+    def _fill_row_soa(self, row: np.ndarray, start_pos: Dict[str, float], start_val: float,
+                      values: np.ndarray, gradients: np.ndarray, improvements: np.ndarray,
+                      axis_codes: np.ndarray, dir_codes: np.ndarray):
+        """Writes one zeroed feature row from measurement columns of equal length (at most 10)."""
         # Ensure the order of axes for consistency (u, v, w, x, y, z)
-        axis_order = ['u', 'v', 'w', 'x', 'y', 'z']
+        axis_order = AXIS_ORDER
 
-        # 1. Prepare input features for prediction
-        input_data = []
+        if _build_row_jit is not None:
+            _build_row_jit(np.array([start_pos.get(axis, 0.0) for axis in axis_order], dtype=np.float32),
+                           np.float32(start_val), axis_codes, dir_codes, values, gradients, improvements, row)
+            return
 
         # Add start_pos and start_val
-        for axis in axis_order:
-            input_data.append(start_pos.get(axis, 0.0)) # Use 0.0 if axis not present
-        input_data.append(start_val)
-
-        # Add measurements (first 10, pad if less than 10)
-        # Each measurement contributes 5 features: value, gradient, relativeImprovement, axis (one-hot), direction (one-hot)
-        # You might need to adjust this based on how your training script encoded categorical features (axis, direction)
-        # For simplicity here, let's assume direct numerical values or some basic encoding.
-        # A more robust solution would be to use the same preprocessing as in training.
-
-        # If you used one-hot encoding for axis and direction during training,
-        # you need to recreate that here.
-        # Example (simplified, assuming fixed axis order and direction mapping):
-        num_measurements_to_use = 10
-        for i in range(num_measurements_to_use):
-            if i < len(measurements):
-                m = measurements[i]
-                input_data.append(m.get('value', 0.0))
-                input_data.append(m.get('gradient', 0.0))
-                input_data.append(m.get('relativeImprovement', 0.0))
-                # Simplified categorical encoding (replace with actual one-hot from training)
-                input_data.append(1.0 if m.get('axis') == 'X' else 0.0) # Example: One-hot for X
-                input_data.append(1.0 if m.get('axis') == 'Y' else 0.0) # Example: One-hot for Y
-                input_data.append(1.0 if m.get('axis') == 'Z' else 0.0) # Example: One-hot for Z
-                input_data.append(1.0 if m.get('direction') == 'Positive' else 0.0) # Example: One-hot for Positive
-                input_data.append(1.0 if m.get('direction') == 'Negative' else 0.0) # Example: One-hot for Negative
-            else:
-                # Pad with zeros if fewer than 10 measurements
-                input_data.extend([0.0] * 8) # 5 numerical + 3 axis OHE + 2 direction OHE (adjust count based on your actual encoding)
+        for j, axis in enumerate(axis_order):
+            row[j] = start_pos.get(axis, 0.0) # Use 0.0 if axis not present
+        row[6] = start_val
 
-        # Convert to numpy array and reshape for the model (batch size 1)
-        X_pred = np.array(input_data).reshape(1, -1)
+        # Add measurements (zero padded if less than 10), one strided slice per feature.
+        # Each measurement contributes 8 features: value, gradient, relativeImprovement,
+        # axis one-hot (X, Y, Z) and direction one-hot (Positive, Negative).
+        # This must match how the training script encoded the categorical features.
+        start = len(axis_order) + 1
+        step = FEATURES_PER_MEASUREMENT
+        stop = start + len(values) * step
+        row[start:stop:step] = values
+        row[start + 1:stop:step] = gradients
+        row[start + 2:stop:step] = improvements
+        row[start + 3:stop:step] = axis_codes == 0 # X
+        row[start + 4:stop:step] = axis_codes == 1 # Y
+        row[start + 5:stop:step] = axis_codes == 2 # Z
+        row[start + 6:stop:step] = dir_codes == 0 # Positive
+        row[start + 7:stop:step] = dir_codes == 1 # Negative
 
+    def _run_scaled(self, X_pred: np.ndarray) -> np.ndarray:
+        """Scales X_pred in place, runs the model and returns unscaled (N, n_targets) predictions."""
         # Ensure X_pred has the same number of features as feature_columns
         if self.feature_columns and X_pred.shape[1] != len(self.feature_columns):
              raise ValueError(f"Input features mismatch. Expected {len(self.feature_columns)} but got {X_pred.shape[1]}. Check your preprocessing in `predict` method.")
 
-
-        # Scale the input data using the loaded scaler
-        X_pred_scaled = self.scaler_X.transform(X_pred)
+        # Scale the input data in place (same arithmetic as scaler_X.transform)
+        if self._x_inv_scale is not None:
+            np.multiply(X_pred, self._x_inv_scale, out=X_pred)
+            np.add(X_pred, self._x_shift, out=X_pred)
 
         # Make the prediction
-        y_pred_scaled = self.model.predict(X_pred_scaled)
+        y_pred = self._run_model(X_pred)
 
         # Inverse transform the prediction to get actual peak position and value
-        y_pred = self.scaler_y.inverse_transform(y_pred_scaled)[0] # Take first (and only) sample
+        if self._y_scale is not None:
+            y_pred = y_pred * self._y_scale + self._y_mean
+        return y_pred
 
+    def _format_prediction(self, y_pred: np.ndarray, start_val: float) -> Dict[str, Any]:
+        """Maps one row of unscaled model output to the prediction dictionary."""
         # Map predictions back to the target columns (e.g., u, v, w, x, y, z, value)
-        predicted_position = {}
-        predicted_value = 0.0
-        improvement_factor = 1.0 # This would typically be calculated from start_val and predicted_value
-
-        if self.target_columns:
-            # Assuming target_columns holds the order: 'u', 'v', 'w', 'x', 'y', 'z', 'value'
-            for i, col in enumerate(self.target_columns):
-                if col in axis_order: # It's a position coordinate
-                    predicted_position[col] = y_pred[i]
-                elif col == 'value': # It's the predicted peak value
-                    predicted_value = y_pred[i]
-
-            if start_val != 0:
-                improvement_factor = predicted_value / start_val
-        else:
-            # Fallback if target_columns is not loaded (less ideal, assumes fixed output order)
-            # This needs to match the exact output order of your model
-            predicted_position = {
-                'u': y_pred[0], 'v': y_pred[1], 'w': y_pred[2],
-                'x': y_pred[3], 'y': y_pred[4], 'z': y_pred[5]
-            }
-            predicted_value = y_pred[6] # Assuming value is the 7th output
-            if start_val != 0:
-                improvement_factor = predicted_value / start_val
+        predicted_position = {col: y_pred[i] for i, col in self._pos_slots}
+        predicted_value = y_pred[self._val_slot] if self._val_slot is not None else 0.0
+        improvement_factor = 1.0
 
+        if start_val != 0:
+            improvement_factor = predicted_value / start_val
 
         return {
             'predicted_position': predicted_position,
             'predicted_value': predicted_value,
             'improvement_factor': improvement_factor
-        }
\ No newline at end of file
+        }
+
+    def predict(self, start_pos: Dict[str, float], start_val: float, measurements: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Makes a prediction for the peak position and value.
+        """
+        # Prepare input features for prediction, written straight into the reused buffer
+        X_pred = self._X_buf
+        X_pred.fill(0.0) # Missing axes and padded measurements stay 0.0
+        self._fill_row(X_pred[0], start_pos, start_val, measurements)
+
+        y_pred = self._run_scaled(X_pred)[0] # Take first (and only) sample
+        return self._format_prediction(y_pred, start_val)
+
+    def predict_soa(self, start_pos: Dict[str, float], start_val: float, values: np.ndarray,
+                    gradients: np.ndarray, improvements: np.ndarray, axis_codes: np.ndarray,
+                    dir_codes: np.ndarray) -> Dict[str, Any]:
+        """
+        Same as predict(), with the measurements given as columns instead of a list of dicts.
+        axis_codes and dir_codes use AXIS_CODES / DIRECTION_CODES (-1 for unknown).
+        Only the first 10 entries of each column are used.
+        """
+        n = NUM_MEASUREMENTS
+        X_pred = self._X_buf
+        X_pred.fill(0.0)
+        self._fill_row_soa(X_pred[0], start_pos, start_val,
+                           np.asarray(values, dtype=np.float32)[:n],
+                           np.asarray(gradients, dtype=np.float32)[:n],
+                           np.asarray(improvements, dtype=np.float32)[:n],
+                           np.asarray(axis_codes, dtype=np.int8)[:n],
+                           np.asarray(dir_codes, dtype=np.int8)[:n])
+
+        y_pred = self._run_scaled(X_pred)[0]
+        return self._format_prediction(y_pred, start_val)
+
+    def predict_many(self, inputs: List[Tuple[Dict[str, float], float, List[Dict[str, Any]]]]) -> List[Dict[str, Any]]:
+        """
+        Makes predictions for many (start_pos, start_val, measurements) inputs with one model call.
+        Returns one result per input, in order.
+        """
+        if not inputs:
+            return []
+        X_pred = np.zeros((len(inputs), N_INPUT_FEATURES), dtype=np.float32)
+        for row, (start_pos, start_val, measurements) in zip(X_pred, inputs):
+            self._fill_row(row, start_pos, start_val, measurements)
+
+        y_pred = self._run_scaled(X_pred)
+        return [self._format_prediction(y_row, start_val) for y_row, (_, start_val, _) in zip(y_pred, inputs)]
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Convert a saved scanner peak model to TFLite, ONNX or a SavedModel')
+    parser.add_argument('model_path', help='Directory containing model.h5')
+    parser.add_argument('--fuse', action='store_true',
+                        help='Fold the scalers into the model first (writes model_fused.h5)')
+    parser.add_argument('--artifacts', action='store_true',
+                        help='Also pack the scalers and column lists into artifacts.npz')
+    parser.add_argument('--saved-model', action='store_true',
+                        help='Export a SavedModel directory instead of a TFLite file')
+    parser.add_argument('--onnx', action='store_true',
+                        help='Export an ONNX model for ONNX Runtime instead of a TFLite file')
+    parser.add_argument('--quantize', choices=['none', 'dynamic', 'float16'], default='none',
+                        help='dynamic: int8 weights with float activations; float16: for the GPU delegate')
+    args = parser.parse_args()
+
+    if args.fuse:
+        fuse_scalers(args.model_path)
+    if args.artifacts:
+        export_artifacts(args.model_path)
+    if args.saved_model:
+        export_saved_model(args.model_path)
+    elif args.onnx:
+        export_onnx(args.model_path)
+    else:
+        convert_to_tflite(args.model_path, None if args.quantize == 'none' else args.quantize)
\ No newline at end of file
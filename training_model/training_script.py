@@ -9,36 +9,217 @@ Usage:
 """
 
 import argparse
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-import pandas as pd
 import json
 from pathlib import Path
-import matplotlib.pyplot as plt
-import seaborn as sns
 # --- FIX STARTS HERE ---
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_squared_error, r2_score, mean_absolute_error
+from sklearn.metrics import mean_squared_error, mean_absolute_error
 # --- FIX ENDS HERE ---
 import tensorflow as tf
 from tensorflow import keras
 from tensorflow.keras import layers
-import joblib
 from typing import Dict, List, Tuple, Optional
 import warnings
 warnings.filterwarnings('ignore')
 
+try:
+    import orjson  # C parser, noticeably faster than the stdlib on large scan files
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+try:
+    import cupy  # GPU scaling for very large datasets (see _fit_scale)
+    from cuml.preprocessing import StandardScaler as cuStandardScaler
+except ImportError:
+    cupy = None
+
+try:
+    from numba import njit  # Compiles the feature/target kernel to native code when installed
+except ImportError:
+    njit = None
+
+# Below this many rows the host/GPU copies cost more than sklearn's CPU scaling
+GPU_SCALER_MIN_ROWS = 100_000
+
+# Scan files are read and parsed in threads: the reads overlap and orjson releases the GIL
+LOAD_WORKERS = min(32, (os.cpu_count() or 1) * 2)
+
+# Move encoding = axis code + direction offset; every known pair is precomputed once
+_AXIS_CODES = {'X': 1, 'Y': 2, 'Z': 3}
+_DIRECTION_OFFSETS = {'Positive': 0.1, 'Negative': -0.1}
+_MOVE_ENCODINGS = {
+    (axis, direction): axis_code + offset
+    for axis, axis_code in _AXIS_CODES.items()
+    for direction, offset in _DIRECTION_OFFSETS.items()
+}
+
+# Flattened measurement layout for the feature kernel: value, gradient, improvement, axis index, direction index.
+# Missing or unknown axes/directions map to Z / Positive, as in encode_axis_direction.
+_AXIS_INDEX = {axis: i for i, axis in enumerate(_AXIS_CODES)}
+_DIRECTION_INDEX = {direction: i for i, direction in enumerate(_DIRECTION_OFFSETS)}
+_DEFAULT_AXIS_INDEX = _AXIS_INDEX['Z']
+_DEFAULT_DIRECTION_INDEX = _DIRECTION_INDEX['Positive']
+_AXIS_VALUES = np.array(list(_AXIS_CODES.values()), dtype=np.float64)
+_DIRECTION_VALUES = np.array(list(_DIRECTION_OFFSETS.values()), dtype=np.float64)
+
+def _compute_features_loop(starts, peaks, meas, counts, to_peak, X, y):
+    """Feature/target kernel over flattened scans, written as plain loops for numba.njit"""
+    for i in range(starts.shape[0]):
+        for j in range(7):
+            X[i, j] = starts[i, j]
+        last = counts[i] - 1
+        for k in range(10):
+            src = min(k, last)  # Pad by repeating the last measurement
+            X[i, 7 + k] = meas[i, src, 0]
+            X[i, 17 + k] = meas[i, src, 1]
+            X[i, 27 + k] = meas[i, src, 2]
+            X[i, 37 + k] = _AXIS_VALUES[int(meas[i, src, 3])] + _DIRECTION_VALUES[int(meas[i, src, 4])]
+        for j in range(6):
+            y[i, j] = peaks[i, j] - starts[i, j]
+        y[i, 6] = peaks[i, 6]
+        y[i, 7] = peaks[i, 6] / starts[i, 6] if starts[i, 6] != 0 else 1.0
+        y[i, 8] = to_peak[i]
+
+def _compute_features_numpy(starts, peaks, meas, counts, to_peak, X, y):
+    """Same kernel as _compute_features_loop, vectorized over all scans for when numba is unavailable"""
+    X[:, 0:7] = starts
+    rows = np.arange(len(counts))[:, None]
+    padded = meas[rows, np.minimum(np.arange(10), counts[:, None] - 1)]  # (N, 10, 5)
+    X[:, 7:17] = padded[:, :, 0]
+    X[:, 17:27] = padded[:, :, 1]
+    X[:, 27:37] = padded[:, :, 2]
+    X[:, 37:47] = (_AXIS_VALUES[padded[:, :, 3].astype(np.intp)]
+                   + _DIRECTION_VALUES[padded[:, :, 4].astype(np.intp)])
+    y[:, 0:6] = peaks[:, 0:6] - starts[:, 0:6]
+    y[:, 6] = peaks[:, 6]
+    y[:, 7] = np.divide(peaks[:, 6], starts[:, 6], out=np.ones(len(counts)), where=starts[:, 6] != 0)
+    y[:, 8] = to_peak
+
+_compute_features = njit(cache=True)(_compute_features_loop) if njit is not None else _compute_features_numpy
+
+def _measurements_soa(scan: Dict) -> Tuple[np.ndarray, int]:
+    """First 10 measurements of a scan as a (10, 5) array in the feature-kernel layout, plus how many rows are used
+    
+    With no measurements, one dummy row at the baseline value (Z, Positive) is used;
+    the kernel pads the remaining rows by repeating the last used one.
+    """
+    start_value = scan['baseline']['value']
+    first_10 = scan['measurements'][:10]
+    soa = np.zeros((10, 5))
+    if not first_10:
+        soa[0] = (start_value, 0.0, 0.0, _DEFAULT_AXIS_INDEX, _DEFAULT_DIRECTION_INDEX)
+        return soa, 1
+    soa[:len(first_10)] = [
+        (m.get('value', start_value), m.get('gradient', 0.0), m.get('relativeImprovement', 0.0),
+         _AXIS_INDEX.get(m.get('axis'), _DEFAULT_AXIS_INDEX),
+         _DIRECTION_INDEX.get(m.get('direction'), _DEFAULT_DIRECTION_INDEX))
+        for m in first_10
+    ]
+    return soa, len(first_10)
+
+def _find_scan_files(data_dir: Path) -> List[Path]:
+    """Scan JSON files in data_dir, sorted by name; the first pattern that matches anything wins"""
+    if not data_dir.exists():
+        raise FileNotFoundError(f"Data directory not found: {data_dir}")
+    
+    # Look for JSON files matching the scan pattern
+    json_patterns = ["ScanResults_*.json", "scan_*.json", "*.json"]
+    for pattern in json_patterns:
+        found_files = list(data_dir.glob(pattern))
+        if found_files:
+            return sorted(found_files)
+    
+    raise FileNotFoundError(f"No JSON scan files found in {data_dir}")
+
+# Bump when extract_features changes, so cached datasets from older code are not reused
+FEATURE_CACHE_VERSION = 1
+
+def _dataset_signature(scan_files: List[Path]) -> str:
+    """Hash of the scan files' names, sizes and modification times"""
+    entries = []
+    for f in scan_files:
+        st = f.stat()
+        entries.append((f.name, st.st_mtime_ns, st.st_size))
+    return hashlib.md5(repr((FEATURE_CACHE_VERSION, entries)).encode()).hexdigest()
+
+# Key under which load_scan_data stores each scan's _measurements_soa result
+MEASUREMENTS_SOA_KEY = '_measurements_soa'
+
+def _read_scan_file(file_path: Path):
+    """Read and parse one scan file; errors are returned, not raised, so one bad file does not stop the pool"""
+    try:
+        scan = json_loads(file_path.read_bytes())
+    except Exception as e:
+        return e
+    # Flatten the measurements here, in the worker thread, so feature extraction skips the dict walk
+    try:
+        scan[MEASUREMENTS_SOA_KEY] = _measurements_soa(scan)
+    except Exception:
+        pass  # Malformed scans are reported by extract_features
+    return scan
+
 # The rest of your script would follow here...
 # (You might also have a definition for `training_script.py` in your earlier conversation, make sure this file matches that one)
 
+def _fit_scale(scaler: StandardScaler, data: np.ndarray) -> np.ndarray:
+    """Fit scaler on data and return data scaled in place; large arrays are fitted with cuML when available"""
+    if cupy is None or len(data) < GPU_SCALER_MIN_ROWS:
+        return scaler.fit(data).transform(data, copy=False)
+    gpu_scaler = cuStandardScaler()
+    data_gpu = gpu_scaler.fit_transform(cupy.asarray(data))
+    # Copy the fitted statistics into the sklearn scaler so saved models never need cuML
+    scaler.mean_ = cupy.asnumpy(gpu_scaler.mean_)
+    scaler.var_ = cupy.asnumpy(gpu_scaler.var_)
+    scaler.scale_ = cupy.asnumpy(gpu_scaler.scale_)
+    scaler.n_samples_seen_ = len(data)
+    scaler.n_features_in_ = data.shape[1]
+    data[...] = cupy.asnumpy(data_gpu)
+    return data
+
+def _make_dataset(X: np.ndarray, y: np.ndarray, batch_size: int, shuffle: bool) -> tf.data.Dataset:
+    """Batched tf.data pipeline over in-memory arrays; cached once and prefetched every epoch"""
+    ds = tf.data.Dataset.from_tensor_slices((X, y)).cache()
+    if shuffle:
+        ds = ds.shuffle(buffer_size=len(X), seed=42, reshuffle_each_iteration=True)
+    ds = ds.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+    options = tf.data.Options()
+    options.deterministic = False
+    return ds.with_options(options)
+
+@tf.function(reduce_retracing=True)
+def _regression_metrics(y_true, y_pred):
+    """[MSE (the training loss), MAE, R²], computed in-graph
+    
+    R² is the mean of the per-target scores, as with sklearn's r2_score default.
+    """
+    error = y_true - y_pred
+    ss_res = tf.reduce_sum(tf.square(error), axis=0)
+    ss_tot = tf.reduce_sum(tf.square(y_true - tf.reduce_mean(y_true, axis=0)), axis=0)
+    # A constant target scores 1 when predicted exactly and 0 otherwise, as in sklearn
+    r2 = tf.where(ss_tot > 0, 1.0 - tf.math.divide_no_nan(ss_res, ss_tot),
+                  tf.where(ss_res > 0, 0.0, 1.0))
+    return tf.stack([tf.reduce_mean(tf.square(error)), tf.reduce_mean(tf.abs(error)), tf.reduce_mean(r2)])
+
 class ScannerPeakPredictor:
     """Neural Network model to predict peak locations from initial scan measurements"""
     
     def __init__(self, model_name: str = "scanner_peak_predictor"):
         self.model_name = model_name
         self.model = None
+        self._infer = None  # Cached forward passes for self._infer_model (see _forward_tensor)
+        self._infer_one = None
+        self._infer_model = None
         self.feature_scaler = StandardScaler()
         self.target_scaler = StandardScaler()
+        # True when the model applies both scalers itself (raw features in, unscaled targets out);
+        # models saved before the scalers were folded in expect scaled data on both ends
+        self.scalers_in_model = False
         
         # Feature names for the 47 input features
         self.feature_names = [
@@ -74,142 +255,122 @@ class ScannerPeakPredictor:
     
     def load_scan_data(self, data_dir: str) -> List[Dict]:
         """Load all JSON scan files from directory"""
-        data_dir = Path(data_dir)
-        
-        if not data_dir.exists():
-            raise FileNotFoundError(f"Data directory not found: {data_dir}")
-        
-        # Look for JSON files matching the scan pattern
-        json_patterns = ["ScanResults_*.json", "scan_*.json", "*.json"]
-        scan_files = []
-        
-        for pattern in json_patterns:
-            found_files = list(data_dir.glob(pattern))
-            if found_files:
-                scan_files.extend(found_files)
-                break
-        
-        if not scan_files:
-            raise FileNotFoundError(f"No JSON scan files found in {data_dir}")
+        scan_files = _find_scan_files(Path(data_dir))
         
         scans = []
-        for file_path in sorted(scan_files):
-            try:
+        with ThreadPoolExecutor(max_workers=LOAD_WORKERS) as executor:
+            # map() yields in submission order, so scans keep the sorted file order
+            for file_path, scan_data in zip(scan_files, executor.map(_read_scan_file, scan_files)):
                 print(f"Loading: {file_path.name}")
-                with open(file_path, 'r') as f:
-                    scan_data = json.load(f)
-                    scans.append(scan_data)
-            except Exception as e:
-                print(f"Error loading {file_path}: {e}")
-                continue
+                if isinstance(scan_data, Exception):
+                    print(f"Error loading {file_path}: {scan_data}")
+                    continue
+                scans.append(scan_data)
         
         print(f"Successfully loaded {len(scans)} scan files")
         return scans
     
     def encode_axis_direction(self, axis: str, direction: str) -> float:
         """Encode axis and direction as a single numerical value"""
-        axis_map = {'X': 1, 'Y': 2, 'Z': 3}
-        direction_map = {'Positive': 0.1, 'Negative': -0.1}
-        return axis_map.get(axis, 3) + direction_map.get(direction, 0.1)
+        encoded = _MOVE_ENCODINGS.get((axis, direction))
+        if encoded is None:
+            # Unknown axis or direction: default to Z / Positive for the unknown part
+            encoded = _AXIS_CODES.get(axis, 3) + _DIRECTION_OFFSETS.get(direction, 0.1)
+        return encoded
     
-    def extract_features(self, scan_data: Dict) -> Tuple[np.ndarray, np.ndarray]:
-        """Extract features from scan data for training"""
-        baseline = scan_data['baseline']
-        peak = scan_data['peak']
-        measurements = scan_data['measurements']
-        
-        # Starting position features (6)
-        features = [
-            baseline['position']['u'],
-            baseline['position']['v'], 
-            baseline['position']['w'],
-            baseline['position']['x'],
-            baseline['position']['y'],
-            baseline['position']['z'],
-            baseline['value']  # Starting measurement value
-        ]
-        
-        # Get first 10 measurements - pad with baseline if fewer measurements
+    def _measurement_columns(self, measurements: List[Dict],
+                             start_value: float) -> Tuple[List[float], List[float], List[float], List[float]]:
+        """Unpack the first 10 measurements into value, gradient, improvement and encoded-move columns
+        
+        Each measurement's fields are read once. Fewer than 10 measurements are padded by repeating
+        the last one; with none at all, a dummy measurement at the start value (Z, Positive) is used.
+        """
+        vals, grads, imps, encs = [0.0] * 10, [0.0] * 10, [0.0] * 10, [0.0] * 10
+        encode = self.encode_axis_direction
         first_10 = measurements[:10]
-        while len(first_10) < 10:
-            if first_10:
-                # Pad with last measurement
-                last_measurement = first_10[-1].copy()
-                first_10.append(last_measurement)
-            else:
-                # Create dummy measurement from baseline
-                dummy_measurement = {
-                    'value': baseline['value'],
-                    'gradient': 0.0,
-                    'relativeImprovement': 0.0,
-                    'axis': 'Z',
-                    'direction': 'Positive'
-                }
-                first_10.append(dummy_measurement)
-        
-        # Measurement values (10 features)
-        for i in range(10):
-            features.append(first_10[i].get('value', baseline['value']))
-        
-        # Measurement gradients (10 features)
-        for i in range(10):
-            features.append(first_10[i].get('gradient', 0.0))
-        
-        # Measurement improvements (10 features)  
-        for i in range(10):
-            features.append(first_10[i].get('relativeImprovement', 0.0))
-        
-        # Movement patterns encoded (10 features)
-        for i in range(10):
-            axis = first_10[i].get('axis', 'Z')
-            direction = first_10[i].get('direction', 'Positive')
-            features.append(self.encode_axis_direction(axis, direction))
-        
-        # Target values (9 outputs)
-        targets = [
-            # Peak position deltas (6)
-            peak['position']['u'] - baseline['position']['u'],
-            peak['position']['v'] - baseline['position']['v'],
-            peak['position']['w'] - baseline['position']['w'], 
-            peak['position']['x'] - baseline['position']['x'],
-            peak['position']['y'] - baseline['position']['y'],
-            peak['position']['z'] - baseline['position']['z'],
-            # Peak value (1)
-            peak['value'],
-            # Improvement factor (1)
-            peak['value'] / baseline['value'] if baseline['value'] != 0 else 1.0,
-            # Measurements to peak (1)
-            next((i+1 for i, m in enumerate(measurements) if m.get('isPeak', False)), len(measurements))
-        ]
+        for i, m in enumerate(first_10):
+            vals[i] = m.get('value', start_value)
+            grads[i] = m.get('gradient', 0.0)
+            imps[i] = m.get('relativeImprovement', 0.0)
+            encs[i] = encode(m.get('axis', 'Z'), m.get('direction', 'Positive'))
+        
+        n = len(first_10)
+        if n == 0:
+            vals[:] = [start_value] * 10
+            encs[:] = [encode('Z', 'Positive')] * 10
+        elif n < 10:
+            for column in (vals, grads, imps, encs):
+                column[n:] = [column[n - 1]] * (10 - n)
+        return vals, grads, imps, encs
+    
+    def extract_features(self, scans: List[Dict]) -> Tuple[np.ndarray, np.ndarray, Dict[int, Exception]]:
+        """Extract features and targets for all scans in one batched pass
+        
+        Returns (X, y, errors): one row per usable scan, in order, and the exception
+        for each scan that could not be used, keyed by its index in scans.
+        """
+        n_scans = len(scans)
+        # Python prelude: flatten each scan's JSON into arrays; the numeric work runs in _compute_features
+        starts = np.empty((n_scans, 7))  # Baseline position + value, kept in float64 for the deltas
+        peaks = np.empty((n_scans, 7))   # Peak position + value
+        meas = np.empty((n_scans, 10, 5))  # First 10 measurements (see _measurements_soa)
+        counts = np.empty(n_scans, dtype=np.int64)
+        to_peak = np.empty(n_scans)
+        errors = {}
+        
+        n = 0  # Rows written; a failed scan's partial row is overwritten by the next one
+        for i, scan_data in enumerate(scans):
+            try:
+                baseline = scan_data['baseline']
+                peak = scan_data['peak']
+                measurements = scan_data['measurements']
+                pos = baseline['position']
+                peak_pos = peak['position']
+                start_value = baseline['value']
+                
+                # Starting position + starting measurement value (7)
+                starts[n] = (pos['u'], pos['v'], pos['w'], pos['x'], pos['y'], pos['z'], start_value)
+                peaks[n] = (peak_pos['u'], peak_pos['v'], peak_pos['w'],
+                            peak_pos['x'], peak_pos['y'], peak_pos['z'], peak['value'])
+                
+                # First 10 measurements, already flattened by load_scan_data unless the scan came from elsewhere
+                soa = scan_data.get(MEASUREMENTS_SOA_KEY)
+                if soa is None:
+                    soa = _measurements_soa(scan_data)
+                meas[n], counts[n] = soa
+                
+                # Measurements to peak
+                to_peak[n] = next((j+1 for j, m in enumerate(measurements) if m.get('isPeak', False)), len(measurements))
+            except Exception as e:
+                errors[i] = e
+                continue
+            n += 1
+        
+        # Features (47) and targets (9): deltas, peak value, improvement factor, measurements to peak
+        X = np.empty((n, len(self.feature_names)), dtype=np.float32)
+        y = np.empty((n, len(self.target_names)), dtype=np.float32)
+        _compute_features(starts[:n], peaks[:n], meas[:n], counts[:n], to_peak[:n], X, y)
         
-        return np.array(features), np.array(targets)
+        return X, y, errors
     
     def prepare_dataset(self, scans: List[Dict]) -> Tuple[np.ndarray, np.ndarray]:
         """Prepare training dataset from scan data"""
-        all_features = []
-        all_targets = []
-        
         print("\nProcessing scan data...")
+        X, y, errors = self.extract_features(scans)
+        
+        row = 0
         for i, scan in enumerate(scans):
-            try:
-                features, targets = self.extract_features(scan)
-                all_features.append(features)
-                all_targets.append(targets)
-                
-                scan_id = scan.get('scanId', f'scan_{i+1}')
-                print(f"  {scan_id}: baseline={targets[6]:.2e}, peak={targets[6]:.2e}, improvement={targets[7]:.1f}x")
-                
-            except Exception as e:
-                scan_id = scan.get('scanId', f'scan_{i+1}')
-                print(f"  Error processing {scan_id}: {e}")
+            scan_id = scan.get('scanId', f'scan_{i+1}')
+            if i in errors:
+                print(f"  Error processing {scan_id}: {errors[i]}")
                 continue
+            targets = y[row]
+            row += 1
+            print(f"  {scan_id}: baseline={targets[6]:.2e}, peak={targets[6]:.2e}, improvement={targets[7]:.1f}x")
         
-        if not all_features:
+        if len(X) == 0:
             raise ValueError("No valid scan data found!")
         
-        X = np.array(all_features)
-        y = np.array(all_targets)
-        
         print(f"\nDataset prepared:")
         print(f"  Features shape: {X.shape} (samples x features)")
         print(f"  Targets shape: {y.shape} (samples x targets)")
@@ -218,8 +379,48 @@ class ScannerPeakPredictor:
         
         return X, y
     
-    def build_model(self, input_dim: int, output_dim: int, architecture: str = "medium") -> keras.Model:
-        """Build neural network model"""
+    def load_dataset(self, data_dir: str, cache_dir: Optional[str] = './.cache') -> Tuple[np.ndarray, np.ndarray]:
+        """Load and prepare the dataset in data_dir, reusing a cached copy when the scan files are unchanged
+        
+        The cache is an .npz of X and y keyed by the files' names, sizes and modification
+        times, so a rerun on the same data skips JSON parsing and feature extraction.
+        Pass cache_dir=None to always rebuild.
+        """
+        if cache_dir is None:
+            return self.prepare_dataset(self.load_scan_data(data_dir))
+        
+        scan_files = _find_scan_files(Path(data_dir))
+        cache_path = Path(cache_dir) / f"features_{_dataset_signature(scan_files)}.npz"
+        if cache_path.exists():
+            with np.load(cache_path) as data:
+                X, y = data['X'], data['y']
+            print(f"Loaded cached dataset for {len(scan_files)} scan files: {cache_path}")
+            print(f"  Features shape: {X.shape} (samples x features)")
+            print(f"  Targets shape: {y.shape} (samples x targets)")
+            return X, y
+        
+        X, y = self.prepare_dataset(self.load_scan_data(data_dir))
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez(cache_path, X=X, y=y)
+        print(f"Cached dataset: {cache_path}")
+        return X, y
+    
+    def build_model(self, input_dim: int, output_dim: int, architecture: str = "medium",
+                    jit_compile: bool = True,
+                    feature_scaler: Optional[StandardScaler] = None,
+                    steps_per_execution: int = 1,
+                    mixed_precision: bool = False) -> keras.Model:
+        """Build neural network model
+        
+        jit_compile=True has XLA fuse each training step (Dense+BN+ReLU+Dropout and the Adam
+        update) into a few kernels; the first step pays a one-off compile of a few seconds.
+        steps_per_execution runs that many batches per call into the compiled step; progress
+        output and batch-level callbacks then update only once per group of batches.
+        With a fitted feature_scaler the model standardizes raw features itself through
+        fixed Rescaling layers; otherwise it starts with a BatchNormalization layer.
+        mixed_precision=True runs the hidden layers in float16 (Tensor Cores on recent NVIDIA
+        GPUs); input normalization, BatchNormalization statistics and the output stay float32.
+        """
         
         architectures = {
             "simple": [64, 32],
@@ -229,73 +430,113 @@ class ScannerPeakPredictor:
         }
         
         layer_sizes = architectures.get(architecture, architectures["medium"])
+        # Set per layer rather than globally, so models built elsewhere in the process are unaffected
+        hidden_dtype = 'mixed_float16' if mixed_precision else None
+        
+        if feature_scaler is not None:
+            # (x - mean_) / scale_ as two Rescaling layers (x * scale + offset). Normalization would floor
+            # the std at 1e-7, which power readings with ~1e-8 spreads fall below; this has no epsilon.
+            # Kept float32: raw feature spreads that small underflow in float16
+            input_normalization = [
+                layers.Rescaling(1.0, offset=(-feature_scaler.mean_).tolist(),
+                                 dtype='float32', name='input_centering'),
+                layers.Rescaling((1.0 / feature_scaler.scale_).tolist(),
+                                 dtype='float32', name='input_normalization'),
+            ]
+        else:
+            input_normalization = [layers.BatchNormalization(name='input_normalization')]
         
         model = keras.Sequential([
             layers.Input(shape=(input_dim,), name='input_features'),
-            layers.BatchNormalization(name='input_normalization'),
+            *input_normalization,
         ])
         
         # Add hidden layers with dropout and batch normalization
         for i, size in enumerate(layer_sizes):
-            model.add(layers.Dense(size, activation='relu', name=f'hidden_{i+1}'))
-            model.add(layers.BatchNormalization(name=f'batch_norm_{i+1}'))
+            model.add(layers.Dense(size, activation='relu', dtype=hidden_dtype, name=f'hidden_{i+1}'))
+            model.add(layers.BatchNormalization(dtype=hidden_dtype, name=f'batch_norm_{i+1}'))
             if i == 0:
-                model.add(layers.Dropout(0.4, name=f'dropout_{i+1}'))  # Higher dropout for first layer
+                model.add(layers.Dropout(0.4, dtype=hidden_dtype, name=f'dropout_{i+1}'))  # Higher dropout for first layer
             else:
-                model.add(layers.Dropout(0.2, name=f'dropout_{i+1}'))
+                model.add(layers.Dropout(0.2, dtype=hidden_dtype, name=f'dropout_{i+1}'))
         
-        # Output layer
-        model.add(layers.Dense(output_dim, activation='linear', name='output_predictions'))
+        # Output layer, float32 so the loss is computed at full precision
+        model.add(layers.Dense(output_dim, activation='linear', dtype='float32', name='output_predictions'))
         
         # Compile model with adaptive learning rate
         optimizer = keras.optimizers.Adam(learning_rate=0.001)
+        if mixed_precision:
+            # Loss scaling keeps small float16 gradients from flushing to zero. Keras only adds it
+            # on its own under a global mixed policy, which is not used here
+            optimizer = keras.mixed_precision.LossScaleOptimizer(optimizer)
         model.compile(
             optimizer=optimizer,
             loss='mse',
-            metrics=['mae', 'mse']
+            metrics=['mae', 'mse'],
+            jit_compile=jit_compile,
+            steps_per_execution=steps_per_execution
         )
         
         return model
     
-    def train(self, scans: List[Dict], 
+    def train(self, scans: Optional[List[Dict]] = None, 
               validation_split: float = 0.2,
               epochs: int = 200,
-              batch_size: int = 4,
+              batch_size: int = 32,
               architecture: str = "medium",
               early_stopping_patience: int = 25,
               learning_rate: float = 0.001,
-              verbose: int = 1) -> Dict:
-        """Train the neural network model"""
+              verbose: int = 1,
+              jit_compile: bool = True,
+              mixed_precision: bool = True,
+              dataset: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> Dict:
+        """Train the neural network model
+        
+        Trains on scans, or on an already prepared (X, y) dataset (see load_dataset).
+        mixed_precision only takes effect when a GPU is visible; on CPU float16 is slower.
+        """
         
         print(f"\n{'='*60}")
         print("TRAINING SCANNER PEAK PREDICTION MODEL")
         print(f"{'='*60}")
         
         # Prepare dataset
-        X, y = self.prepare_dataset(scans)
+        if dataset is not None:
+            X, y = dataset
+            y = np.array(y, dtype=np.float32)  # Copy: the targets are scaled in place below
+        else:
+            X, y = self.prepare_dataset(scans)
         
         if len(X) < 3:
             print("Warning: Very small dataset! Consider gathering more scan data.")
         
         # Scale features and targets
         print("\nNormalizing data...")
-        X_scaled = self.feature_scaler.fit_transform(X)
-        y_scaled = self.target_scaler.fit_transform(y)
+        # Features are standardized inside the model, so their scaler is only fitted.
+        # Targets are scaled in place: y is float32 and owned by train() (built here or copied above)
+        self.feature_scaler.fit(X)
+        y_scaled = _fit_scale(self.target_scaler, y)
         
         # Split data
         if len(X) > 2:
             X_train, X_val, y_train, y_val = train_test_split(
-                X_scaled, y_scaled, test_size=validation_split, random_state=42
+                X, y_scaled, test_size=validation_split, random_state=42
             )
         else:
             # For very small datasets, use all data for training
-            X_train, X_val, y_train, y_val = X_scaled, X_scaled, y_scaled, y_scaled
+            X_train, X_val, y_train, y_val = X, X, y_scaled, y_scaled
             print("Warning: Using same data for training and validation due to small dataset size")
         
         print(f"Train samples: {len(X_train)}, Validation samples: {len(X_val)}")
         
         # Build model
-        self.model = self.build_model(X.shape[1], y.shape[1], architecture)
+        # Group up to 32 batches per execution to amortize the per-step dispatch cost
+        steps_per_execution = min(32, max(1, len(X_train) // batch_size))
+        mixed_precision = mixed_precision and bool(tf.config.list_physical_devices('GPU'))
+        self.model = self.build_model(X.shape[1], y.shape[1], architecture, jit_compile=jit_compile,
+                                      feature_scaler=self.feature_scaler,
+                                      steps_per_execution=steps_per_execution,
+                                      mixed_precision=mixed_precision)
         
         if verbose:
             print(f"\nModel Architecture ({architecture}):")
@@ -320,26 +561,33 @@ class ScannerPeakPredictor:
         
         # Train model
         print(f"\nStarting training for {epochs} epochs...")
+        train_ds = _make_dataset(X_train, y_train, batch_size, shuffle=True)
+        val_ds = _make_dataset(X_val, y_val, batch_size, shuffle=False)
         history = self.model.fit(
-            X_train, y_train,
-            validation_data=(X_val, y_val),
+            train_ds,
+            validation_data=val_ds,
             epochs=epochs,
-            batch_size=batch_size,
             callbacks=callbacks,
             verbose=verbose
         )
         
-        # Evaluate model
+        # Evaluate model: [loss, mae] and R² of the weights the model ends up with, in inference mode,
+        # from a single forward pass over both splits. The predictions stay on the device and only
+        # the scores are copied back
         print("\nEvaluating model performance...")
-        train_metrics = self.model.evaluate(X_train, y_train, verbose=0)
-        val_metrics = self.model.evaluate(X_val, y_val, verbose=0)
+        y_pred = self._forward_tensor(np.concatenate([X_train, X_val]))
+        n_train = len(X_train)
         
-        # Calculate R² scores
-        y_train_pred = self.model.predict(X_train, verbose=0)
-        y_val_pred = self.model.predict(X_val, verbose=0)
+        *train_metrics, train_r2 = _regression_metrics(y_train, y_pred[:n_train]).numpy().tolist()
+        *val_metrics, val_r2 = _regression_metrics(y_val, y_pred[n_train:]).numpy().tolist()
         
-        train_r2 = r2_score(y_train, y_train_pred)
-        val_r2 = r2_score(y_val, y_val_pred)
+        # Fold the target inverse transform into the model too: inference is then a single graph
+        # from raw features to unscaled targets. x * scale_ + mean_ is exactly inverse_transform
+        target_denormalization = layers.Rescaling(self.target_scaler.scale_.tolist(),
+                                                  offset=self.target_scaler.mean_.tolist(),
+                                                  name='output_denormalization')
+        self.model = keras.Sequential([self.model, target_denormalization])
+        self.scalers_in_model = True
         
         # Create results summary
         results = {
@@ -370,56 +618,26 @@ class ScannerPeakPredictor:
         
         return results
     
-    def predict(self, 
-                start_position: Dict[str, float],
-                start_value: float,
-                first_10_measurements: List[Dict]) -> Dict:
-        """Predict peak location and value from initial scan data"""
-        
-        if self.model is None:
-            raise ValueError("Model not trained. Call train() first or load a trained model.")
-        
-        # Prepare features (same as training)
+    def _prediction_features(self,
+                             start_position: Dict[str, float],
+                             start_value: float,
+                             first_10_measurements: List[Dict]) -> List[float]:
+        """Build the 47-feature input row for one scan (same layout as training)"""
         features = [
             start_position['u'], start_position['v'], start_position['w'],
             start_position['x'], start_position['y'], start_position['z'],
             start_value
         ]
         
-        # Pad measurements to 10 if needed
-        measurements = first_10_measurements.copy()
-        while len(measurements) < 10:
-            if measurements:
-                measurements.append(measurements[-1].copy())
-            else:
-                measurements.append({
-                    'value': start_value,
-                    'gradient': 0.0,
-                    'relativeImprovement': 0.0,
-                    'axis': 'Z',
-                    'direction': 'Positive'
-                })
-        
-        # Add measurement features
-        for i in range(10):
-            features.append(measurements[i].get('value', start_value))
-        for i in range(10):
-            features.append(measurements[i].get('gradient', 0.0))
-        for i in range(10):
-            features.append(measurements[i].get('relativeImprovement', 0.0))
-        for i in range(10):
-            axis = measurements[i].get('axis', 'Z')
-            direction = measurements[i].get('direction', 'Positive')
-            features.append(self.encode_axis_direction(axis, direction))
-        
-        # Scale and predict
-        X = np.array([features])
-        X_scaled = self.feature_scaler.transform(X)
-        y_pred_scaled = self.model.predict(X_scaled, verbose=0)
-        y_pred = self.target_scaler.inverse_transform(y_pred_scaled)[0]
+        # Add measurement features (padded to 10)
+        for column in self._measurement_columns(first_10_measurements, start_value):
+            features.extend(column)
         
-        # Format results
-        predicted_peak = {
+        return features
+    
+    def _format_prediction(self, start_position: Dict[str, float], y_pred: np.ndarray) -> Dict:
+        """Turn one row of unscaled model output into the prediction dictionary"""
+        return {
             'predicted_position': {
                 'u': start_position['u'] + y_pred[0],
                 'v': start_position['v'] + y_pred[1], 
@@ -441,8 +659,77 @@ class ScannerPeakPredictor:
                 'efficiency_estimate': y_pred[7] / max(1, y_pred[8])  # improvement per measurement
             }
         }
+    
+    def _forward_tensor(self, X: np.ndarray) -> tf.Tensor:
+        """Run the model through a cached tf.function, rebuilt when self.model changes"""
+        if self._infer_model is not self.model:
+            model = self.model
+            forward = lambda x: model(x, training=False)
+            # reduce_retracing keeps one trace for all batch sizes instead of one per shape
+            self._infer = tf.function(forward, jit_compile=True, reduce_retracing=True)
+            # predict() always sends a single row: a fixed signature is traced exactly once
+            self._infer_one = tf.function(
+                forward, jit_compile=True,
+                input_signature=[tf.TensorSpec([1, len(self.feature_names)], tf.float32)]
+            )
+            self._infer_model = model
+        infer = self._infer_one if len(X) == 1 else self._infer
+        return infer(X)
+    
+    def _forward(self, X: np.ndarray) -> np.ndarray:
+        """_forward_tensor, copied back to NumPy"""
+        return self._forward_tensor(X).numpy()
+    
+    def _predict_rows(self, X: np.ndarray) -> np.ndarray:
+        """Unscaled predictions for raw feature rows"""
+        if self.scalers_in_model:
+            return self._forward(X)
+        return self.target_scaler.inverse_transform(self._forward(self.feature_scaler.transform(X)))
+    
+    def predict(self, 
+                start_position: Dict[str, float],
+                start_value: float,
+                first_10_measurements: List[Dict]) -> Dict:
+        """Predict peak location and value from initial scan data"""
         
-        return predicted_peak
+        if self.model is None:
+            raise ValueError("Model not trained. Call train() first or load a trained model.")
+        
+        # Prepare features (same as training)
+        features = self._prediction_features(start_position, start_value, first_10_measurements)
+        
+        # Predict (scaling happens inside the model for models trained with the scalers folded in)
+        X = np.array([features], dtype=np.float32)
+        y_pred = self._predict_rows(X)[0]
+        
+        # Format results
+        return self._format_prediction(start_position, y_pred)
+    
+    def predict_batch(self,
+                      start_positions: List[Dict[str, float]],
+                      start_values: List[float],
+                      measurements: np.ndarray) -> List[Dict]:
+        """Predict many scans with a single model call; returns one result per scan, in order.
+        
+        measurements has shape (N, 4, 10): value, gradient, relativeImprovement and
+        encoded axis+direction rows for the first 10 measurements, already padded.
+        """
+        
+        if self.model is None:
+            raise ValueError("Model not trained. Call train() first or load a trained model.")
+        if not start_positions:
+            return []
+        
+        starts = np.array([
+            [pos['u'], pos['v'], pos['w'], pos['x'], pos['y'], pos['z'], val]
+            for pos, val in zip(start_positions, start_values)
+        ], dtype=np.float32)
+        # Row-major ravel of (4, 10) matches the training layout: 10 values, 10 gradients, ...
+        X = np.hstack([starts, np.asarray(measurements, dtype=np.float32).reshape(len(starts), -1)])
+        # Calling the model directly skips predict()'s per-call dataset and callback setup
+        y_pred = self._predict_rows(X)
+        
+        return [self._format_prediction(pos, row) for pos, row in zip(start_positions, y_pred)]
     
     def save_model(self, filepath: str):
         """Save trained model and scalers"""
@@ -456,6 +743,7 @@ class ScannerPeakPredictor:
         self.model.save(f"{filepath}_model.keras")
         
         # Save scalers
+        import joblib
         joblib.dump(self.feature_scaler, f"{filepath}_feature_scaler.pkl")
         joblib.dump(self.target_scaler, f"{filepath}_target_scaler.pkl")
         
@@ -465,7 +753,8 @@ class ScannerPeakPredictor:
             'target_names': self.target_names,
             'model_name': self.model_name,
             'n_features': len(self.feature_names),
-            'n_targets': len(self.target_names)
+            'n_targets': len(self.target_names),
+            'scalers_in_model': self.scalers_in_model
         }
         
         with open(f"{filepath}_metadata.json", 'w') as f:
@@ -473,6 +762,28 @@ class ScannerPeakPredictor:
         
         print(f"Model saved to {filepath}_* files")
     
+    def export_for_inference(self, filepath: str, precision: str = 'FP16') -> Path:
+        """Export a TensorRT-optimized SavedModel to <filepath>_trt for NVIDIA GPU inference
+        
+        The plain SavedModel is written to <filepath>_saved_model first and then converted.
+        Load the result with tf.saved_model.load(); its serving signature takes raw features
+        when scalers_in_model is set and scaled features otherwise.
+        """
+        if self.model is None:
+            raise ValueError("No model to export. Train first.")
+        
+        from tensorflow.python.compiler.tensorrt import trt_convert as trt
+        
+        saved_model_dir = f"{filepath}_saved_model"
+        trt_dir = f"{filepath}_trt"
+        tf.saved_model.save(self.model, saved_model_dir)
+        converter = trt.TrtGraphConverterV2(input_saved_model_dir=saved_model_dir, precision_mode=precision)
+        converter.convert()
+        converter.save(trt_dir)
+        
+        print(f"TensorRT ({precision}) model saved to {trt_dir}")
+        return Path(trt_dir)
+    
     def load_model(self, filepath: str):
         """Load trained model and scalers"""
         filepath = Path(filepath)
@@ -481,6 +792,7 @@ class ScannerPeakPredictor:
         self.model = keras.models.load_model(f"{filepath}_model.keras")
         
         # Load scalers
+        import joblib
         self.feature_scaler = joblib.load(f"{filepath}_feature_scaler.pkl")
         self.target_scaler = joblib.load(f"{filepath}_target_scaler.pkl")
         
@@ -491,11 +803,14 @@ class ScannerPeakPredictor:
         self.feature_names = metadata['feature_names']
         self.target_names = metadata['target_names']
         self.model_name = metadata['model_name']
+        self.scalers_in_model = metadata.get('scalers_in_model', False)
         
         print(f"Model loaded from {filepath}_* files")
     
     def plot_training_history(self, history):
         """Plot training history"""
+        import matplotlib.pyplot as plt  # Imported here: costly, and only needed with --plot
+        
         fig, axes = plt.subplots(2, 2, figsize=(15, 10))
         
         # Loss
@@ -556,8 +871,8 @@ def main():
     # Training parameters
     parser.add_argument('--epochs', type=int, default=200,
                        help='Number of training epochs (default: 200)')
-    parser.add_argument('--batch_size', type=int, default=4,
-                       help='Batch size for training (default: 4)')
+    parser.add_argument('--batch_size', type=int, default=32,
+                       help='Batch size for training (default: 32)')
     parser.add_argument('--learning_rate', type=float, default=0.001,
                        help='Learning rate (default: 0.001)')
     parser.add_argument('--architecture', type=str, default='medium',
@@ -573,6 +888,16 @@ def main():
                        help='Plot training history')
     parser.add_argument('--verbose', type=int, default=1,
                        help='Verbosity level (0, 1, or 2)')
+    parser.add_argument('--no_jit_compile', action='store_true',
+                       help='Disable XLA compilation of the training step')
+    parser.add_argument('--no_mixed_precision', action='store_true',
+                       help='Train in float32 only, even on a GPU')
+    parser.add_argument('--tensorrt', type=str, choices=['FP32', 'FP16'], default=None,
+                       help='Also export a TensorRT-optimized SavedModel at this precision (NVIDIA GPUs)')
+    parser.add_argument('--cache_dir', type=str, default='./.cache',
+                       help='Directory for cached prepared datasets (default: ./.cache)')
+    parser.add_argument('--no_cache', action='store_true',
+                       help='Always re-read the scan files instead of using a cached dataset')
     
     args = parser.parse_args()
     
@@ -582,27 +907,27 @@ def main():
         
         # Load scan data
         print(f"Loading scan data from: {args.data_dir}")
-        scans = predictor.load_scan_data(args.data_dir)
-        
-        if len(scans) == 0:
-            print("Error: No scan data loaded!")
-            return
+        dataset = predictor.load_dataset(args.data_dir, None if args.no_cache else args.cache_dir)
         
         # Train model
         results = predictor.train(
-            scans=scans,
+            dataset=dataset,
             epochs=args.epochs,
             batch_size=args.batch_size,
             architecture=args.architecture,
             validation_split=args.validation_split,
             early_stopping_patience=args.early_stopping_patience,
             learning_rate=args.learning_rate,
-            verbose=args.verbose
+            verbose=args.verbose,
+            jit_compile=not args.no_jit_compile,
+            mixed_precision=not args.no_mixed_precision
         )
         
         # Save model
         output_path = Path(args.output_dir) / args.model_name
         predictor.save_model(str(output_path))
+        if args.tensorrt:
+            predictor.export_for_inference(str(output_path), args.tensorrt)
         
         # Plot training history if requested
         if args.plot: